@@ -8,14 +8,14 @@ fi
 
 OUTPUT="$1".txt
 
-python3 backups.py >> "$OUTPUT" 2>&1
-python3 event-bridge.py >> "$OUTPUT" 2>&1
-python3 iam.py >> "$OUTPUT" 2>&1
-python3 kms.py >> "$OUTPUT" 2>&1
-python3 lambda.py >> "$OUTPUT" 2>&1
-python3 ram.py >> "$OUTPUT" 2>&1
-python3 security-services.py >> "$OUTPUT" 2>&1
-python3 region-service-discover.py >> "$OUTPUT" 2>&1
-python3 s3.py >> "$OUTPUT" 2>&1
-python3 ami.py >> "$OUTPUT" 2>&1
+python3 scan.py backups >> "$OUTPUT" 2>&1
+python3 scan.py event-bridge >> "$OUTPUT" 2>&1
+python3 scan.py iam >> "$OUTPUT" 2>&1
+python3 scan.py kms >> "$OUTPUT" 2>&1
+python3 scan.py lambda >> "$OUTPUT" 2>&1
+python3 scan.py ram >> "$OUTPUT" 2>&1
+python3 scan.py security-services >> "$OUTPUT" 2>&1
+python3 scan.py region-service-discover >> "$OUTPUT" 2>&1
+python3 scan.py s3 >> "$OUTPUT" 2>&1
+python3 scan.py ami >> "$OUTPUT" 2>&1
 
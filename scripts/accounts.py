@@ -0,0 +1,135 @@
+import os
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import timezone
+
+import boto3
+import botocore.session
+from botocore.credentials import RefreshableCredentials
+
+from clients import current_session, get_client, get_session, release_session, set_session_account
+
+DEFAULT_ROLE_NAME = os.environ.get('SCAN_ASSUME_ROLE', 'OrganizationAccountAccessRole')
+SESSION_DURATION = int(os.environ.get('SCAN_ASSUME_ROLE_DURATION', '3600'))
+
+AccountResult = namedtuple('AccountResult', ['account_id', 'account_name', 'result', 'error'])
+
+def list_org_accounts(active_only=True):
+    org = get_client('organizations')
+    accounts = []
+    paginator = org.get_paginator('list_accounts')
+    for page in paginator.paginate():
+        for account in page['Accounts']:
+            if active_only and account.get('Status') != 'ACTIVE':
+                continue
+            accounts.append(account)
+    return accounts
+
+class CredentialCache:
+    """One refreshable assumed-role session per member account.
+
+    Credentials are fetched on first use and refreshed by botocore shortly
+    before they expire, so a long org-wide run never sees an expired token.
+    Sessions share the default session's data loader, so service models are
+    still only loaded once per process. The caller's own account uses the
+    default session instead of assuming a role.
+    """
+
+    def __init__(self, role_name=DEFAULT_ROLE_NAME, session_name='aws-org-migration-scan', duration=SESSION_DURATION):
+        self.role_name = role_name
+        self.session_name = session_name
+        self.duration = duration
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._caller_account = None
+
+    def caller_account(self):
+        if self._caller_account is None:
+            self._caller_account = get_client('sts', session=get_session()).get_caller_identity()['Account']
+        return self._caller_account
+
+    def _assume(self, account_id):
+        sts = get_client('sts', session=get_session())
+        response = sts.assume_role(
+            RoleArn=f"arn:aws:iam::{account_id}:role/{self.role_name}",
+            RoleSessionName=self.session_name,
+            DurationSeconds=self.duration
+        )
+        creds = response['Credentials']
+        return {
+            'access_key': creds['AccessKeyId'],
+            'secret_key': creds['SecretAccessKey'],
+            'token': creds['SessionToken'],
+            'expiry_time': creds['Expiration'].astimezone(timezone.utc).isoformat()
+        }
+
+    def _new_session(self, account_id):
+        credentials = RefreshableCredentials.create_from_metadata(
+            metadata=self._assume(account_id),
+            refresh_using=lambda: self._assume(account_id),
+            method='sts-assume-role'
+        )
+        base = get_session()
+        core = botocore.session.get_session()
+        core._credentials = credentials
+        core.register_component('data_loader', base._session.get_component('data_loader'))
+        return boto3.Session(botocore_session=core, region_name=base.region_name)
+
+    def get(self, account_id):
+        if account_id == self.caller_account():
+            session = get_session()
+            set_session_account(session, account_id)
+            return session
+        with self._lock:
+            session = self._sessions.get(account_id)
+        if session is None:
+            session = self._new_session(account_id)
+            with self._lock:
+                session = self._sessions.setdefault(account_id, session)
+            set_session_account(session, account_id)
+        return session
+
+    def release(self, account_id):
+        with self._lock:
+            session = self._sessions.pop(account_id, None)
+        if session is not None:
+            release_session(session)
+
+@contextmanager
+def use_session(session):
+    """Make `session` the one get_client uses in this context (and in fanout workers)."""
+    token = current_session.set(session)
+    try:
+        yield session
+    finally:
+        current_session.reset(token)
+
+def iter_for_accounts(accounts, func, *args, credentials=None, max_workers=4, **kwargs):
+    """Run func(account_id, *args, **kwargs) once per account under that account's session.
+
+    Yields AccountResult tuples in the order of `accounts`, each as soon as it
+    and every account before it have finished. An account whose role cannot
+    be assumed, or whose scan raises, is recorded with its exception and does
+    not stop the others.
+    """
+    credentials = credentials or CredentialCache()
+
+    def run_one(account):
+        account_id = account['Id']
+        try:
+            session = credentials.get(account_id)
+            with use_session(session):
+                result = func(account_id, *args, **kwargs)
+            return AccountResult(account_id, account.get('Name'), result, None)
+        except Exception as e:
+            return AccountResult(account_id, account.get('Name'), None, e)
+        finally:
+            credentials.release(account_id)
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        yield from pool.map(run_one, accounts)
+
+def run_for_accounts(accounts, func, *args, **kwargs):
+    return list(iter_for_accounts(accounts, func, *args, **kwargs))
@@ -0,0 +1,97 @@
+import os
+
+from async_engine import call_many
+from clients import get_client
+from fanout import iter_regions
+from findings import Finding, emit
+from regions import get_enabled_regions
+
+ATTRIBUTE_WORKERS = int(os.environ.get('AMI_ATTRIBUTE_WORKERS', '8'))
+
+def is_aws_backup_ami(image):
+    # Check for AWS Backup tag
+    tags = {tag['Key']: tag['Value'] for tag in image.get('Tags', [])}
+    if 'aws:backup:source-resource' in tags:
+        return True
+    # Optionally, check description for AWS Backup
+    if 'Description' in image and 'AWS Backup' in image['Description']:
+        return True
+    return False
+
+def list_owned_images(ec2, account_id, filters=None):
+    paginator = ec2.get_paginator('describe_images')
+    params = {'Owners': [account_id]}
+    if filters:
+        params['Filters'] = filters
+    images = []
+    for page in paginator.paginate(**params):
+        images.extend(page['Images'])
+    return images
+
+def list_public_image_ids(ec2, account_id):
+    """Return the IDs of owned AMIs that are public, using one filtered query."""
+    public = list_owned_images(ec2, account_id, filters=[{'Name': 'is-public', 'Values': ['true']}])
+    return {image['ImageId'] for image in public}
+
+def shared_accounts(perms):
+    return [perm['UserId'] for perm in perms.get('LaunchPermissions', []) if 'UserId' in perm]
+
+def audit_amis_in_region(region_name, account_id, exclude_filters=()):
+    """Audit owned AMIs in a region for public or cross-account sharing.
+
+    Images matching any of `exclude_filters` are dropped before any attribute
+    lookups. Public images are found with a single `is-public` query and are
+    reported without a launch-permission lookup, since they are launchable by
+    everyone; the remaining images are checked through a bounded worker pool,
+    or on the async engine when it is enabled. An image whose lookup fails is
+    reported as an 'error' finding and the rest of the region is still checked.
+    """
+    ec2 = get_client('ec2', region_name)
+    images = [
+        image for image in list_owned_images(ec2, account_id)
+        if not any(exclude(image) for exclude in exclude_filters)
+    ]
+    if not images:
+        return []
+    public_ids = list_public_image_ids(ec2, account_id)
+    private_ids = [image['ImageId'] for image in images if image['ImageId'] not in public_ids]
+
+    responses = call_many(
+        ec2, 'describe_image_attribute',
+        [{'ImageId': ami_id, 'Attribute': 'launchPermission'} for ami_id in private_ids],
+        workers=ATTRIBUTE_WORKERS
+    )
+    shared = {}
+    errors = {}
+    for ami_id, (perms, error) in zip(private_ids, responses):
+        if error is not None:
+            errors[ami_id] = error
+        else:
+            shared[ami_id] = shared_accounts(perms)
+
+    results = []
+    for image in images:
+        ami_id = image['ImageId']
+        if ami_id in public_ids:
+            results.append(Finding('ami', 'public', account_id, region_name, ami_id))
+        elif ami_id in errors:
+            results.append(Finding('ami', 'error', account_id, region_name, ami_id, (),
+                                   f"Could not get launch permissions for AMI {ami_id} in {region_name}: {errors[ami_id]}"))
+        elif shared[ami_id]:
+            results.append(Finding('ami', 'shared', account_id, region_name, ami_id, tuple(shared[ami_id])))
+    return results
+
+def run_audit(exclude_filters=()):
+    """Audit every enabled region, emitting each region's findings as soon as it and the regions before it are done."""
+    account_id = get_client('sts').get_caller_identity()['Account']
+    regions = get_enabled_regions('ec2')
+    found_any = False
+    for region_result in iter_regions(regions, audit_amis_in_region, account_id, exclude_filters):
+        if region_result.error is not None:
+            print(f"  Error scanning region {region_result.region}: {region_result.error}")
+            continue
+        for finding in region_result.result:
+            found_any = True
+            emit(finding)
+    if not found_any:
+        print("No AMIs with cross-account or public permissions found in any active region.")
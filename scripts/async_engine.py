@@ -0,0 +1,241 @@
+import asyncio
+import os
+import signal
+import threading
+import time
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+
+from botocore.config import Config
+
+from clients import add_release_hook, client_config, current_session, get_session
+
+# Requests in flight per service across every account and region; each one is
+# a coroutine and a pooled connection rather than a thread
+DEFAULT_LIMITS = {
+    'ec2': 100,
+    'kms': 200,
+    'lambda': 50,
+    'sso-admin': 50,
+    's3': 500,
+}
+DEFAULT_LIMIT = 100
+# Clients are built from frozen credentials, so rebuild them well before an
+# assumed-role session (SCAN_ASSUME_ROLE_DURATION, one hour by default) expires
+CLIENT_MAX_AGE = int(os.environ.get('SCAN_ASYNC_CLIENT_MAX_AGE', '1800'))
+
+class AsyncEngine:
+    """Run batches of AWS calls as coroutines on one event loop in a background thread.
+
+    Scanner threads hand a batch to call_many() and block until it is done,
+    so the scanners keep their structure while thousands of requests can be
+    in flight at once. Concurrency is bounded by one semaphore per service,
+    shared by every account and region. cancel() cancels everything in
+    flight and makes later batches fail immediately.
+
+    Async clients are not passed to clients.add_client_hook hooks: their
+    handlers may block (the rate limiter sleeps), which would stall the loop.
+    The per-service semaphores take the rate limiter's place here.
+    """
+
+    def __init__(self, limits=None, default_limit=DEFAULT_LIMIT):
+        try:
+            from aiobotocore.session import get_session as get_aio_session
+        except ImportError:
+            raise SystemExit("The async engine requires aiobotocore: pip install aiobotocore")
+        self.limits = dict(DEFAULT_LIMITS)
+        self.limits.update(limits or {})
+        self.default_limit = default_limit
+        self.cancelled = False
+        self._aio_session = get_aio_session()
+        self._clients = {}
+        self._semaphores = {}
+        self._retired = []
+        self._futures = set()
+        self._lock = threading.Lock()
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name='async-engine', daemon=True)
+        self._thread.start()
+
+    def _semaphore(self, service):
+        semaphore = self._semaphores.get(service)
+        if semaphore is None:
+            semaphore = self._semaphores[service] = asyncio.Semaphore(self.limits.get(service, self.default_limit))
+        return semaphore
+
+    async def _create_client(self, service, region, session):
+        credentials = session.get_credentials().get_frozen_credentials()
+        config = client_config().merge(Config(max_pool_connections=self.limits.get(service, self.default_limit)))
+        return await self._aio_session.create_client(
+            service,
+            region_name=region,
+            aws_access_key_id=credentials.access_key,
+            aws_secret_access_key=credentials.secret_key,
+            aws_session_token=credentials.token,
+            config=config
+        ).__aenter__()
+
+    async def _client(self, service, region, session):
+        # Everything here runs on the loop thread, so the dict needs no lock;
+        # concurrent callers await the same creation task
+        key = (service, region, session)
+        entry = self._clients.get(key)
+        if entry is not None and time.monotonic() - entry[0] > CLIENT_MAX_AGE:
+            # Calls may still be using the old client; it is closed with the engine
+            self._retired.append(entry[1])
+            entry = None
+        if entry is None:
+            entry = self._clients[key] = (time.monotonic(), self.loop.create_task(self._create_client(*key)))
+        return await entry[1]
+
+    async def _close_clients(self, tasks):
+        for task in tasks:
+            try:
+                client = await task
+                await client.close()
+            except Exception:
+                pass  # Closing connections must not hide the scan's own outcome
+
+    async def _call(self, service, region, session, operation, params, result_key):
+        async with self._semaphore(service):
+            client = await self._client(service, region, session)
+            if result_key is None:
+                return await getattr(client, operation)(**params)
+            items = []
+            async for page in client.get_paginator(operation).paginate(**params):
+                items.extend(page.get(result_key, []))
+            return items
+
+    async def _gather(self, service, region, session, operation, params_list, result_key):
+        async def one(params):
+            try:
+                return await self._call(service, region, session, operation, params, result_key), None
+            except Exception as e:
+                return None, e
+        return await asyncio.gather(*(one(params) for params in params_list))
+
+    def _run(self, coro):
+        if self.cancelled:
+            coro.close()
+            raise CancelledError()
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        with self._lock:
+            self._futures.add(future)
+        try:
+            return future.result()
+        finally:
+            with self._lock:
+                self._futures.discard(future)
+
+    def call_many(self, service, region, session, operation, params_list, result_key=None):
+        """Return [(response, error)] for `operation` called with each params dict, in order.
+
+        With `result_key`, every call is paginated and its response is the
+        list of items collected from that key across pages.
+        """
+        return self._run(self._gather(service, region, session, operation, list(params_list), result_key))
+
+    def release(self, session):
+        """Close a session's clients once its account has been scanned."""
+        def drop():
+            tasks = [self._clients.pop(key)[1] for key in [k for k in self._clients if k[2] is session]]
+            self.loop.create_task(self._close_clients(tasks))
+        self.loop.call_soon_threadsafe(drop)
+
+    def cancel(self):
+        """Cancel every batch in flight; safe to call from a signal handler."""
+        self.cancelled = True
+        with self._lock:
+            futures = list(self._futures)
+        for future in futures:
+            future.cancel()
+
+    async def _close_all(self):
+        tasks = [entry[1] for entry in self._clients.values()] + self._retired
+        self._clients = {}
+        self._retired = []
+        await self._close_clients(tasks)
+
+    def close(self):
+        if not self.loop.is_running():
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._close_all(), self.loop).result(timeout=30)
+        except Exception:
+            pass  # Closing connections must not hide the scan's own outcome
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
+
+def parse_limits(values):
+    """Parse ['kms=400', 'ec2=50'] into {'kms': 400, 'ec2': 50}."""
+    limits = {}
+    for value in values or []:
+        service, _, limit = value.partition('=')
+        if not limit:
+            raise ValueError(f"Expected SERVICE=LIMIT, got {value!r}")
+        limits[service] = int(limit)
+    return limits
+
+_engine = None
+
+def enable(limits=None, default_limit=DEFAULT_LIMIT):
+    """Run per-resource call batches on the async engine from now on; Ctrl-C cancels them."""
+    global _engine
+    if _engine is None:
+        _engine = AsyncEngine(limits, default_limit)
+        add_release_hook(_engine.release)
+        if threading.current_thread() is threading.main_thread():
+            default_handler = signal.getsignal(signal.SIGINT)
+
+            def on_interrupt(signum, frame):
+                # Cancel before KeyboardInterrupt unwinds into thread pool
+                # shutdowns that would otherwise wait on the blocked batches
+                _engine.cancel()
+                if callable(default_handler):
+                    default_handler(signum, frame)
+                else:
+                    raise KeyboardInterrupt
+            signal.signal(signal.SIGINT, on_interrupt)
+    return _engine
+
+def enabled():
+    return _engine is not None
+
+def _call_sync(client, operation, params, result_key):
+    if result_key is None:
+        return getattr(client, operation)(**params)
+    items = []
+    for page in client.get_paginator(operation).paginate(**params):
+        items.extend(page.get(result_key, []))
+    return items
+
+def call_many(client, operation, params_list, workers=8, result_key=None):
+    """Call `operation` once per params dict and return [(response, error)] in the same order.
+
+    Runs on the async engine when it is enabled, using the service and region
+    of `client` and the context's current session; otherwise the calls go
+    through `client` on a pool of `workers` threads. With `result_key`, each
+    call is paginated and returns the items under that key.
+    """
+    params_list = list(params_list)
+    if not params_list:
+        return []
+    if _engine is not None:
+        session = current_session.get() or get_session()
+        return _engine.call_many(client.meta.service_model.service_name, client.meta.region_name, session,
+                                 operation, params_list, result_key)
+
+    def one(params):
+        try:
+            return _call_sync(client, operation, params, result_key), None
+        except Exception as e:
+            return None, e
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(params_list)))) as pool:
+        return list(pool.map(one, params_list))
+
+def close():
+    global _engine
+    if _engine is not None:
+        _engine.close()
+        _engine = None
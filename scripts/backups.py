@@ -1,53 +1,141 @@
-import boto3
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
 from botocore.exceptions import ClientError
 
-def get_all_regions():
-    """Retrieve all enabled AWS regions for the Backup service."""
-    ec2 = boto3.client('ec2')
-    regions = ec2.describe_regions(AllRegions=False)
-    return [region['RegionName'] for region in regions['Regions']]
+from clients import get_client, set_max_pool_connections
+from fanout import run_in_regions, report_failures
+from regions import get_enabled_regions
+import snapshot_store
+
+def list_backup_vaults(client):
+    vaults = []
+    paginator = client.get_paginator('list_backup_vaults')
+    for page in paginator.paginate():
+        vaults.extend(page['BackupVaultList'])
+    return vaults
+
+def merge_source_accounts(totals, source_accounts):
+    """Fold per-account [count, oldest, newest] entries into `totals` (dates are UTC ISO strings)."""
+    for source_account, (count, oldest, newest) in source_accounts.items():
+        entry = totals.get(source_account)
+        if entry is None:
+            totals[source_account] = [count, oldest, newest]
+        else:
+            entry[0] += count
+            entry[1] = min(entry[1], oldest)
+            entry[2] = max(entry[2], newest)
+    return totals
+
+def scan_vault(client, vault, account_id, store=None):
+    """Aggregate a vault's cross-account recovery points by source account.
+
+    Returns (source_accounts, points_read). With a snapshot store, the vault's
+    previous aggregate and watermark (the newest CreationDate seen) are loaded
+    and only recovery points created after the watermark are read, so repeat
+    scans of a large vault cost a page or two. Points deleted since the last
+    full scan are not subtracted; run without --incremental to rebuild.
+    """
+    vault_arn = vault['BackupVaultArn']
+    snapshot = store.get(vault_arn) if store else None
+    source_accounts = dict(snapshot.findings) if snapshot else {}
+    watermark = previous = snapshot.marker if snapshot else None
+
+    params = {'BackupVaultName': vault['BackupVaultName']}
+    if watermark:
+        params['ByCreatedAfter'] = datetime.fromisoformat(watermark)
+    new_accounts = {}
+    points_read = 0
+    paginator = client.get_paginator('list_recovery_points_by_backup_vault')
+    for page in paginator.paginate(**params):
+        for rp in page['RecoveryPoints']:
+            points_read += 1
+            created = rp['CreationDate'].astimezone(timezone.utc).isoformat()
+            # ByCreatedAfter may include the boundary point, which is already counted
+            if previous is not None and created <= previous:
+                continue
+            if watermark is None or created > watermark:
+                watermark = created
+            source_account = rp.get('SourceAccountId')
+            if source_account and source_account != account_id:
+                merge_source_accounts(new_accounts, {source_account: (1, created, created)})
+    merge_source_accounts(source_accounts, new_accounts)
+
+    if store:
+        store.put(vault_arn, 'backup', watermark, source_accounts)
+    return source_accounts, points_read
 
-def list_cross_account_backups(region, account_id):
-    """List cross-account backups in a given region."""
-    client = boto3.client('backup', region_name=region)
+def list_cross_account_backups(region, account_id, store=None, vault_workers=4):
+    """List cross-account backups in a given region, aggregated per vault and source account.
+
+    Returns the report lines for the region instead of printing them so that
+    regions can be scanned concurrently and still print in a stable order.
+    """
+    client = get_client('backup', region)
+    lines = []
     try:
-        vaults = client.list_backup_vaults()['BackupVaultList']
+        vaults = list_backup_vaults(client)
     except ClientError as e:
-        print(f"  Could not access Backup in {region}: {e}")
-        return
+        lines.append(f"  Could not access Backup in {region}: {e}")
+        return lines
 
     if not vaults:
-        print(f"\nRegion: {region} | No backup vaults found.")
-        return
-
-    for vault in vaults:
-        vault_name = vault['BackupVaultName']
-        cross_account_found = False
-        print(f"\nRegion: {region} | Vault: {vault_name}")
-        paginator = client.get_paginator('list_recovery_points_by_backup_vault')
-        for page in paginator.paginate(BackupVaultName=vault_name):
-            for rp in page['RecoveryPoints']:
-                source_account = rp.get('SourceAccountId')
-                if source_account and source_account != account_id:
-                    cross_account_found = True
-                    print(f"  Cross-account backup found:")
-                    print(f"    RecoveryPointArn: {rp['RecoveryPointArn']}")
-                    print(f"    SourceAccountId: {source_account}")
-                    print(f"    CreationDate: {rp['CreationDate']}")
-        if not cross_account_found:
-            print("  No cross-account backups found in this vault.")
-
-def main():
+        lines.append(f"\nRegion: {region} | No backup vaults found.")
+        return lines
+
+    def scan_one(vault):
+        try:
+            return scan_vault(client, vault, account_id, store), None
+        except ClientError as e:
+            return None, e
+
+    with ThreadPoolExecutor(max_workers=max(1, min(vault_workers, len(vaults)))) as pool:
+        results = list(pool.map(scan_one, vaults))
+
+    for vault, (result, error) in zip(vaults, results):
+        lines.append(f"\nRegion: {region} | Vault: {vault['BackupVaultName']}")
+        if error is not None:
+            lines.append(f"  Could not list recovery points: {error}")
+            continue
+        source_accounts, points_read = result
+        lines.append(f"  Recovery points read: {points_read}")
+        if not source_accounts:
+            lines.append("  No cross-account backups found in this vault.")
+            continue
+        for source_account, (count, oldest, newest) in sorted(source_accounts.items()):
+            lines.append(f"  Cross-account backups from {source_account}: {count} (oldest {oldest}, newest {newest})")
+    return lines
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Report AWS Backup recovery points copied from other accounts.")
+    parser.add_argument('--vault-workers', type=int, default=4, help="Vaults scanned concurrently per region (default: 4)")
+    snapshot_store.add_arguments(parser)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    set_max_pool_connections(args.vault_workers)
+    store = snapshot_store.open_store(args)
+
     # Get current account ID
-    sts = boto3.client('sts')
+    sts = get_client('sts')
     account_id = sts.get_caller_identity()['Account']
 
     # Get all active regions
-    regions = get_all_regions()
+    regions = get_enabled_regions('backup')
     print(f"Found {len(regions)} active regions: {regions}")
 
-    for region in regions:
-        list_cross_account_backups(region, account_id)
+    region_results = run_in_regions(
+        regions, list_cross_account_backups, account_id, store, vault_workers=args.vault_workers
+    )
+    for region_result in region_results:
+        for line in region_result.result or []:
+            print(line)
+    report_failures(region_results)
+    if store:
+        print(store.summary())
+        store.close()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
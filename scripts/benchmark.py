@@ -0,0 +1,255 @@
+import argparse
+import io
+import json
+import os
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, namedtuple
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(SCRIPTS_DIR, 'benchmark_baseline.json')
+
+# Scanner -> (arguments, whether it runs once per account through org_scan).
+# '{tmp}' is replaced with a scratch directory for report files.
+BENCH_SCANNERS = {
+    'ami': ([], True),
+    'backups': ([], True),
+    'event-bridge': ([], True),
+    'iam': ([], True),
+    'kms': ([], True),
+    'lambda': ([], True),
+    'ram': ([], True),
+    's3': (['--object-scan', 'sample'], True),
+    'security-services': ([], True),
+    'sso-report': (['--output', '{tmp}/sso-report.csv'], False),
+}
+
+# Scanner output that reports a failed region, vault, bucket or resource. Scanners
+# carry on past these, so a run that printed one did not do all of its work.
+ERROR_OUTPUT = re.compile(r'\bError\b|Could not|Failed')
+
+BenchResult = namedtuple('BenchResult', ['scanner', 'seconds', 'calls', 'peak_rss_kb', 'error'])
+
+class _Response:
+    status_code = 200
+    headers = {}
+
+class CallRecorder:
+    """botocore event hooks that count calls by operation and add a fixed latency to each.
+
+    The latency stands in for the network round trip the local stand-in does
+    not have, so concurrency changes show up in wall-clock time. DescribeRegions
+    is answered with the synthetic org's regions so region fan-out matches it,
+    and the operations in `stubs` with synthetic data.
+    """
+
+    def __init__(self, latency, org, resources, stubs):
+        self.latency = latency
+        self.org = org
+        self.resources = resources
+        self.stubs = stubs
+        self.calls = Counter()
+        self._lock = threading.Lock()
+
+    def install(self, client, session=None):
+        client.meta.events.register('before-call', self.before_call)
+
+    def before_call(self, model, **kwargs):
+        service = model.service_model.service_name
+        with self._lock:
+            self.calls[f"{service}.{model.name}"] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if service == 'ec2' and model.name == 'DescribeRegions':
+            return _Response(), {'Regions': [
+                {'RegionName': region, 'OptInStatus': 'opt-in-not-required'} for region in self.org.regions
+            ]}
+        stub = self.stubs.get((service, model.name))
+        if stub is not None:
+            return _Response(), stub(self.org, self.resources)
+        return None
+
+def run_one(args):
+    """Build the synthetic org in this process and run one scanner against it, returning its metrics."""
+    try:
+        from moto import mock_aws
+    except ImportError:
+        raise SystemExit("The benchmark requires moto: pip install 'moto[all]'")
+    from clients import add_client_hook
+    from scanners import load_scanner
+    from synthetic_org import STUBBED_OPERATIONS, OrgSpec, build_org
+
+    scanner_args, per_account = BENCH_SCANNERS[args.run_one]
+    with tempfile.TemporaryDirectory() as tmp, mock_aws():
+        org = build_org(OrgSpec(args.accounts, args.regions, args.resources, args.permission_sets,
+                                args.objects_per_bucket))
+        recorder = CallRecorder(args.latency, org, args.resources, STUBBED_OPERATIONS)
+        add_client_hook(recorder.install)
+        scanner_args = [a.replace('{tmp}', tmp) for a in scanner_args]
+        if per_account:
+            import org_scan
+            scan, scan_args = org_scan.main, [args.run_one] + scanner_args
+        else:
+            scan, scan_args = load_scanner(args.run_one), scanner_args
+
+        error = None
+        stdout = sys.stdout
+        output = io.StringIO()
+        started = time.perf_counter()
+        try:
+            sys.stdout = output
+            status = scan(scan_args)
+        except BaseException as e:
+            status = None
+            error = f"{type(e).__name__}: {e}"
+        finally:
+            sys.stdout = stdout
+        seconds = time.perf_counter() - started
+        # Scanners report failed accounts in their exit status and failed
+        # regions or resources only in their output; either way a scanner that
+        # failed would otherwise look faster and cheaper
+        if error is None:
+            failed = [line.strip() for line in output.getvalue().splitlines() if ERROR_OUTPUT.search(line)]
+            if failed:
+                error = failed[0]
+            elif status:
+                error = f"exit status {status}"
+
+    # ru_maxrss is in KiB on Linux; it covers org setup as well as the scan
+    peak_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return BenchResult(args.run_one, seconds, dict(recorder.calls), peak_rss_kb, error)
+
+def spawn(scanner, args):
+    """Run one scanner in a fresh interpreter so peak RSS and client caches are its own."""
+    with tempfile.TemporaryDirectory() as tmp:
+        result_path = os.path.join(tmp, 'result.json')
+        command = [
+            sys.executable, os.path.abspath(__file__), '--run-one', scanner, '--result', result_path,
+            '--accounts', str(args.accounts), '--regions', str(args.regions), '--resources', str(args.resources),
+            '--permission-sets', str(args.permission_sets), '--objects-per-bucket', str(args.objects_per_bucket),
+            '--latency', str(args.latency)
+        ]
+        env = dict(os.environ)
+        env.update({
+            'AWS_ACCESS_KEY_ID': 'testing',
+            'AWS_SECRET_ACCESS_KEY': 'testing',
+            'AWS_SESSION_TOKEN': 'testing',
+            'AWS_DEFAULT_REGION': 'us-east-1',
+            'AWS_ORG_MIGRATION_CACHE_DIR': os.path.join(tmp, 'cache'),
+        })
+        env.pop('AWS_PROFILE', None)
+        completed = subprocess.run(command, cwd=SCRIPTS_DIR, env=env, capture_output=True, text=True)
+        if completed.returncode != 0 or not os.path.exists(result_path):
+            stderr = completed.stderr.strip().splitlines()
+            return BenchResult(scanner, 0.0, {}, 0, stderr[-1] if stderr else 'failed')
+        with open(result_path) as f:
+            return BenchResult(**json.load(f))
+
+def compare(results, baseline, call_tolerance):
+    """Return regression messages for results that make more calls per operation than the baseline."""
+    regressions = []
+    for result in results:
+        base = baseline.get('results', {}).get(result.scanner)
+        if base is None or result.error:
+            continue
+        for operation, count in sorted(result.calls.items()):
+            allowed = base['calls'].get(operation, 0) * (1 + call_tolerance)
+            if count > allowed:
+                regressions.append(
+                    f"{result.scanner}: {operation} called {count} times vs baseline {base['calls'].get(operation, 0)}"
+                )
+    return regressions
+
+def print_timings(results, baseline):
+    """Print runtime against the baseline for information; it depends on the machine and is not checked."""
+    print(f"\n{'Scanner':<20} {'Seconds':>9} {'Baseline':>9} {'Change':>8}")
+    for result in results:
+        base = baseline.get('results', {}).get(result.scanner)
+        if base is None or result.error or not base['seconds']:
+            continue
+        change = (result.seconds - base['seconds']) / base['seconds']
+        print(f"{result.scanner:<20} {result.seconds:>9.2f} {base['seconds']:>9.2f} {change:>+8.0%}")
+
+def print_results(results):
+    print(f"{'Scanner':<20} {'Seconds':>9} {'API calls':>10} {'Peak RSS MiB':>13}")
+    for result in results:
+        if result.error:
+            print(f"{result.scanner:<20} failed: {result.error}")
+            continue
+        print(f"{result.scanner:<20} {result.seconds:>9.2f} {sum(result.calls.values()):>10} "
+              f"{result.peak_rss_kb / 1024:>13.1f}")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the scanners offline against a synthetic organization in a local AWS stand-in (moto)."
+    )
+    parser.add_argument('--scanners', default=','.join(BENCH_SCANNERS),
+                        help="Comma-separated scanners to run (default: all benchmarked scanners)")
+    parser.add_argument('--accounts', type=int, default=3, help="Accounts in the synthetic org (N, default: 3)")
+    parser.add_argument('--regions', type=int, default=2, help="Regions per account (M, default: 2)")
+    parser.add_argument('--resources', type=int, default=10,
+                        help="KMS keys, functions and AMIs per account and region, and buckets per account (K, default: 10)")
+    parser.add_argument('--permission-sets', type=int, default=5, help="Identity Center permission sets (P, default: 5)")
+    parser.add_argument('--objects-per-bucket', type=int, default=20, help="Objects per bucket (default: 20)")
+    parser.add_argument('--latency', type=float, default=0.02, help="Seconds added to every API call (default: 0.02)")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help=f"Baseline file (default: {DEFAULT_BASELINE})")
+    parser.add_argument('--save-baseline', action='store_true', help="Write this run's results as the new baseline")
+    parser.add_argument('--call-tolerance', type=float, default=0.0,
+                        help="Allowed relative increase in calls per operation over the baseline (default: 0)")
+    parser.add_argument('--run-one', choices=sorted(BENCH_SCANNERS), help=argparse.SUPPRESS)
+    parser.add_argument('--result', help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.run_one:
+        with open(args.result, 'w') as f:
+            json.dump(run_one(args)._asdict(), f)
+        return 0
+
+    scanners = [s for s in args.scanners.split(',') if s]
+    unknown = [s for s in scanners if s not in BENCH_SCANNERS]
+    if unknown:
+        raise SystemExit(f"Unknown scanners: {', '.join(unknown)}")
+    shape = {k: getattr(args, k) for k in ('accounts', 'regions', 'resources', 'permission_sets',
+                                           'objects_per_bucket', 'latency')}
+    print(f"Synthetic org: {shape}")
+    results = [spawn(scanner, args) for scanner in scanners]
+    print_results(results)
+    failures = [r for r in results if r.error]
+    if failures:
+        print(f"\n{len(failures)} scanner(s) failed; not comparing or saving a baseline.")
+        return 1
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({'shape': shape, 'results': {r.scanner: r._asdict() for r in results}},
+                      f, indent=1, sort_keys=True)
+        print(f"\nBaseline written to {args.baseline}")
+        return 0
+
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    except OSError:
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to create one.")
+        return 0
+    if baseline.get('shape') != shape:
+        print(f"\nBaseline was recorded for {baseline.get('shape')}; not comparing.")
+        return 0
+    print_timings(results, baseline)
+    regressions = compare(results, baseline, args.call_tolerance)
+    for message in regressions:
+        print(f"REGRESSION {message}")
+    if regressions:
+        return 1
+    print("\nNo call count regressions against the baseline.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
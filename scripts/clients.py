@@ -0,0 +1,96 @@
+import contextvars
+import os
+import threading
+
+import boto3
+from botocore.config import Config
+
+# Sized for the largest per-client worker pool (object ACL workers in s3.py)
+MAX_POOL_CONNECTIONS = int(os.environ.get('SCAN_MAX_POOL_CONNECTIONS', '64'))
+MAX_ATTEMPTS = int(os.environ.get('SCAN_MAX_ATTEMPTS', '10'))
+
+# Error codes AWS services use to signal request throttling
+THROTTLE_CODES = frozenset([
+    'Throttling', 'ThrottlingException', 'ThrottledException', 'TooManyRequestsException',
+    'RequestLimitExceeded', 'RequestThrottled', 'RequestThrottledException', 'SlowDown',
+    'ProvisionedThroughputExceededException', 'LimitExceededException'
+])
+
+_lock = threading.Lock()
+_clients = {}
+_default_session = None
+_client_hooks = []
+_release_hooks = []
+_session_accounts = {}
+
+# Session for the account being scanned; set by accounts.use_session for
+# multi-account runs and inherited by fanout worker threads
+current_session = contextvars.ContextVar('current_session', default=None)
+
+def client_config():
+    return Config(
+        max_pool_connections=MAX_POOL_CONNECTIONS,
+        retries={'mode': 'adaptive', 'max_attempts': MAX_ATTEMPTS}
+    )
+
+def get_session():
+    global _default_session
+    with _lock:
+        if _default_session is None:
+            _default_session = boto3.Session()
+        return _default_session
+
+def get_client(service, region_name=None, session=None):
+    """Return a shared client for (service, region, session).
+
+    Clients are created once per process with adaptive retries and a
+    connection pool sized for the scanners' worker pools, so service models
+    are loaded and TLS connections are set up once rather than per call site.
+    Pass `session` to get clients for other credentials; otherwise the
+    context's current session (an assumed role in multi-account runs) or the
+    default session is used.
+    """
+    session = session or current_session.get() or get_session()
+    key = (service, region_name, session)
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            client = session.client(service, region_name=region_name, config=client_config())
+            for hook in _client_hooks:
+                hook(client, session)
+            _clients[key] = client
+        return client
+
+def add_client_hook(hook):
+    """Call hook(client, session) for every client created from now on, e.g. to register botocore event handlers."""
+    with _lock:
+        _client_hooks.append(hook)
+
+def add_release_hook(hook):
+    """Call hook(session) whenever release_session drops a session's clients."""
+    with _lock:
+        _release_hooks.append(hook)
+
+def set_max_pool_connections(size):
+    """Raise the connection pool size for clients created after this call."""
+    global MAX_POOL_CONNECTIONS
+    MAX_POOL_CONNECTIONS = max(MAX_POOL_CONNECTIONS, size)
+
+def set_session_account(session, account_id):
+    """Record which account a session acts in, for hooks that key state by account."""
+    with _lock:
+        _session_accounts[session] = account_id
+
+def session_account(session):
+    with _lock:
+        return _session_accounts.get(session)
+
+def release_session(session):
+    """Drop cached clients for a session once its account has been scanned."""
+    with _lock:
+        for key in [k for k in _clients if k[2] is session]:
+            del _clients[key]
+        _session_accounts.pop(session, None)
+        hooks = list(_release_hooks)
+    for hook in hooks:
+        hook(session)
@@ -0,0 +1,91 @@
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta, timezone
+
+from clients import get_client
+from local_cache import load_json, save_json
+
+DEFAULT_METRIC = 'UnblendedCost'
+# Late usage, credits and refunds keep changing a month's figures for days
+# after it ends, so a period is only cached once this long has passed
+FINALIZATION_DELAY = timedelta(days=int(os.environ.get('COST_FINALIZATION_DAYS', '10')))
+
+def last_full_month(today=None):
+    """Return (start, end) dates of the last full calendar month; `end` is exclusive."""
+    today = today or datetime.now(timezone.utc).date()
+    end = today.replace(day=1)
+    start = (end - timedelta(days=1)).replace(day=1)
+    return start, end
+
+def is_closed_period(end, today=None):
+    """A period is closed once FINALIZATION_DELAY has passed since it ended, so its costs no longer change."""
+    today = today or datetime.now(timezone.utc).date()
+    return end + FINALIZATION_DELAY <= today
+
+def query_cache_name(account_id, query):
+    digest = hashlib.sha256(json.dumps(query, sort_keys=True).encode()).hexdigest()[:16]
+    period = query['TimePeriod']
+    return f"cost-explorer/{account_id}/{period['Start']}_{period['End']}_{digest}.json"
+
+def region_service_costs(start=None, end=None, metric=DEFAULT_METRIC, use_cache=True):
+    """Return {region: {service: cost}} for [start, end) from one Cost Explorer query.
+
+    The query is grouped by both REGION and SERVICE and paged through
+    NextPageToken, so every region and service ranking can be computed
+    locally. Each Cost Explorer request is billed; results for closed
+    billing periods are cached on disk, keyed by the calling account, the
+    period and the query shape, and never requested again.
+    """
+    if start is None or end is None:
+        start, end = last_full_month()
+    query = {
+        'TimePeriod': {'Start': start.isoformat(), 'End': end.isoformat()},
+        'Granularity': 'MONTHLY',
+        'Metrics': [metric],
+        'GroupBy': [
+            {'Type': 'DIMENSION', 'Key': 'REGION'},
+            {'Type': 'DIMENSION', 'Key': 'SERVICE'}
+        ]
+    }
+    cacheable = use_cache and is_closed_period(end)
+    if cacheable:
+        # Another profile or payer account on the same machine sees other costs
+        account_id = get_client('sts').get_caller_identity()['Account']
+        cache_name = query_cache_name(account_id, query)
+        cached = load_json(cache_name)
+        if cached is not None:
+            return cached
+
+    client = get_client('ce')
+    costs = {}
+    params = dict(query)
+    while True:
+        response = client.get_cost_and_usage(**params)
+        for result in response['ResultsByTime']:
+            for group in result['Groups']:
+                region, service = group['Keys']
+                amount = float(group['Metrics'][metric]['Amount'])
+                services = costs.setdefault(region, {})
+                services[service] = services.get(service, 0.0) + amount
+        token = response.get('NextPageToken')
+        if not token:
+            break
+        params['NextPageToken'] = token
+
+    if cacheable:
+        save_json(cache_name, costs)
+    return costs
+
+def top_regions(costs, limit=5):
+    """Return [(region, total cost)] for the `limit` most expensive regions."""
+    totals = ((region, sum(services.values())) for region, services in costs.items())
+    return sorted(totals, key=lambda x: x[1], reverse=True)[:limit]
+
+def top_services(costs, region, limit=5):
+    """Return [(service, cost)] for the `limit` most expensive services in `region`."""
+    return sorted(costs.get(region, {}).items(), key=lambda x: x[1], reverse=True)[:limit]
+
+def active_regions(costs, min_cost=0.0):
+    """Regions with more than `min_cost` spend, for scanners that only want regions in use."""
+    return sorted(region for region, total in top_regions(costs, limit=None) if total > min_cost)
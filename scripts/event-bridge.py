@@ -1,68 +1,112 @@
-import boto3
+import argparse
 import json
 
+from clients import get_client
+from fanout import iter_regions
+from findings import Finding, emit, from_rows, to_rows
+from policy_analysis import access_principals, analyze_policy, policy_digest, policy_statements
+from regions import get_enabled_regions
+import snapshot_store
+
 def get_account_id():
-    sts = boto3.client('sts')
+    sts = get_client('sts')
     return sts.get_caller_identity()['Account']
 
 def get_org_id():
     try:
-        org = boto3.client('organizations')
+        org = get_client('organizations')
         return org.describe_organization()['Organization']['Id']
     except Exception:
         return None  # Not in an organization
 
-def list_event_buses(region):
-    client = boto3.client('events', region_name=region)
-    buses = client.list_event_buses()['EventBuses']
-    return [bus['Name'] for bus in buses]
+def list_event_buses(client):
+    # events has no paginator for ListEventBuses, so follow NextToken by hand
+    buses = []
+    params = {}
+    while True:
+        response = client.list_event_buses(**params)
+        buses.extend(response.get('EventBuses', []))
+        if not response.get('NextToken'):
+            return buses
+        params['NextToken'] = response['NextToken']
+
+def get_event_bus_policy(client, bus):
+    """Return the bus policy, from the listing when it can be trusted and describe_event_bus otherwise.
 
-def get_event_bus_policy(client, bus_name):
+    Current APIs list every bus with its Policy, if it has one, and its
+    LastModifiedTime, so a listed bus with a modification time and no policy
+    has none. Only listings without either fall back to a describe call.
+    """
+    if bus.get('Policy') or bus.get('LastModifiedTime'):
+        return bus.get('Policy')
+    bus_name = bus['Name']
     try:
         response = client.describe_event_bus(Name=bus_name)
-        policy = response.get('Policy')
-        if policy:
-            return json.loads(policy)
+        return response.get('Policy')
     except client.exceptions.ResourceNotFoundException:
         pass
     return None
 
-def is_cross_account_statement(statement, account_id, org_id):
-    principals = statement.get('Principal')
-    condition = statement.get('Condition', {})
-    # Check for AWS account principal
-    if principals and 'AWS' in principals:
-        aws_principals = principals['AWS']
-        if isinstance(aws_principals, str):
-            aws_principals = [aws_principals]
-        for arn in aws_principals:
-            if account_id not in arn:
-                return True
-    # Check for organization-wide access
-    if 'StringEquals' in condition and 'aws:PrincipalOrgID' in condition['StringEquals']:
-        if org_id and condition['StringEquals']['aws:PrincipalOrgID'] == org_id:
-            return True
-    return False
+def bus_marker(bus):
+    # The listing carries the policy itself or at least a modification time on
+    # current APIs; without either the bus has to be described every run
+    if bus.get('Policy'):
+        return policy_digest(bus['Policy'])
+    if bus.get('LastModifiedTime'):
+        return str(bus['LastModifiedTime'])
+    return None
+
+def classify_bus_policy(bus_name, policy, region, account_id, org_id):
+    analyses = analyze_policy(policy, account_id, org_id)
+    if not analyses:
+        return []
+    statements = policy_statements(json.loads(policy))
+    return [
+        Finding('events', 'cross-org' if analysis.cross_org else 'cross-account', account_id, region, bus_name,
+                access_principals(analysis), statements[analysis.index])
+        for analysis in analyses
+    ]
 
-def main():
-    session = boto3.Session()
+def scan_event_buses_in_region(region, account_id, org_id, store=None):
+    region_findings = []
+    client = get_client('events', region)
+    for bus in list_event_buses(client):
+        bus_name = bus['Name']
+        marker = bus_marker(bus)
+        if store and marker is not None:
+            rows = store.lookup(bus['Arn'], marker)
+            if rows is not None:
+                region_findings.extend(from_rows(rows))
+                continue
+        policy = get_event_bus_policy(client, bus)
+        findings = classify_bus_policy(bus_name, policy, region, account_id, org_id) if policy else []
+        if store and marker is not None:
+            store.put(bus['Arn'], 'events', marker, to_rows(findings))
+        region_findings.extend(findings)
+    return region_findings
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Scan EventBridge bus policies for cross-account and organization access.")
+    snapshot_store.add_arguments(parser)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    store = snapshot_store.open_store(args)
     account_id = get_account_id()
     org_id = get_org_id()
-    regions = [r['RegionName'] for r in boto3.client('ec2').describe_regions()['Regions']]
+    regions = get_enabled_regions('events')
 
-    for region in regions:
-        print(f"\nRegion: {region}")
-        client = boto3.client('events', region_name=region)
-        bus_names = list_event_buses(region)
-        for bus_name in bus_names:
-            policy = get_event_bus_policy(client, bus_name)
-            if not policy:
-                continue
-            statements = policy.get('Statement', [])
-            for stmt in statements:
-                if is_cross_account_statement(stmt, account_id, org_id):
-                    print(f"  Event bus '{bus_name}' has cross-account or org policy:")
-                    print(json.dumps(stmt, indent=2))
+    for region_result in iter_regions(regions, scan_event_buses_in_region, account_id, org_id, store):
+        print(f"\nRegion: {region_result.region}")
+        if region_result.error is not None:
+            print(f"  Error scanning region {region_result.region}: {region_result.error}")
+            continue
+        for finding in region_result.result:
+            emit(finding)
+    if store:
+        print(store.summary())
+        store.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
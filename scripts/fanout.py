@@ -0,0 +1,69 @@
+import contextvars
+import os
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_MAX_WORKERS = int(os.environ.get('SCAN_MAX_WORKERS', '8'))
+
+RegionResult = namedtuple('RegionResult', ['region', 'result', 'error'])
+
+# Process-wide cap on concurrently running region units, shared by every
+# account in a multi-account run; None means only the per-call pool bounds it
+_global_slots = None
+
+def set_global_concurrency(limit):
+    global _global_slots
+    _global_slots = threading.BoundedSemaphore(limit) if limit else None
+
+def bind_context(func):
+    """Wrap func so every call runs in a copy of the caller's context.
+
+    Worker threads do not inherit context variables, and the scanning
+    account's session is carried in one.
+    """
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return context.copy().run(func, *args, **kwargs)
+    return run
+
+def iter_regions(regions, func, *args, max_workers=None, **kwargs):
+    """Run func(region, *args, **kwargs) for every region concurrently, yielding as results arrive.
+
+    RegionResult tuples are yielded in the same order as `regions`, each as
+    soon as it and every region before it have finished, so callers can report
+    early regions while later ones are still running. A region that raises is
+    recorded with its exception so the remaining regions still run to
+    completion.
+    """
+    regions = list(regions)
+    if not regions:
+        return
+    workers = max(1, min(max_workers or DEFAULT_MAX_WORKERS, len(regions)))
+
+    def run_one(region):
+        slots = _global_slots
+        if slots:
+            slots.acquire()
+        try:
+            return RegionResult(region, func(region, *args, **kwargs), None)
+        except Exception as e:
+            return RegionResult(region, None, e)
+        finally:
+            if slots:
+                slots.release()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(bind_context(run_one), regions)
+
+def run_in_regions(regions, func, *args, max_workers=None, **kwargs):
+    """Like iter_regions, but wait for every region and return the results as a list."""
+    return list(iter_regions(regions, func, *args, max_workers=max_workers, **kwargs))
+
+def report_failures(region_results):
+    """Print one line per failed region and return the number of failures."""
+    failures = [r for r in region_results if r.error is not None]
+    for r in failures:
+        print(f"  Error scanning region {r.region}: {r.error}")
+    return len(failures)
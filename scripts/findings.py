@@ -0,0 +1,107 @@
+import json
+import threading
+from collections import namedtuple
+
+from report_sink import JsonlSink
+
+# One reportable result of a scan. Findings are plain tuples, so millions of
+# them cost no more than their field values, and they serialize as one JSON
+# object per line.
+#
+#   scanner     'ami', 'kms', 's3', 'lambda', 'events' or 'iam'
+#   kind        what was found, e.g. 'public', 'shared', 'cross-account',
+#               'cross-org', 'same-org', 'bucket-policy', 'bucket-acl',
+#               'object-acl', 'error'
+#   account     account that was scanned
+#   region      region of the resource (None for IAM)
+#   resource    AMI ID, key ID, bucket, function, event bus or role name
+#   principals  accounts, organizations or ACL grantees that were granted access
+#   detail      kind-specific: the policy statement for policy findings, the
+#               object key for 'object-acl', the full message for 'error'
+Finding = namedtuple('Finding', ['scanner', 'kind', 'account', 'region', 'resource', 'principals', 'detail'],
+                     defaults=((), None))
+
+FIELDS = list(Finding._fields)
+
+def to_rows(findings):
+    """Findings as JSON-serializable lists, e.g. for the snapshot store."""
+    return [list(finding) for finding in findings]
+
+def from_rows(rows):
+    return [Finding(*row)._replace(principals=tuple(row[5])) for row in rows]
+
+def _acl_lines(principals):
+    return "\n".join(f"      - {p}" for p in principals)
+
+# Indentation of error messages in each scanner's text output
+ERROR_INDENT = {'kms': '    ', 's3': '  '}
+
+def render_text(finding):
+    """Rebuild the text each scanner has always printed for a finding."""
+    f = finding
+    if f.kind == 'error':
+        return ERROR_INDENT.get(f.scanner, '') + f.detail
+    if f.scanner == 'ami':
+        text = f"[{f.region}] AMI {f.resource} is shared:"
+        if f.kind == 'shared':
+            text += f"\n  With accounts: {', '.join(f.principals)}"
+        if f.kind == 'public':
+            text += "\n  Publicly accessible!"
+        return text
+    if f.scanner == 'kms':
+        if f.kind == 'cross-org':
+            return f"    [Cross-Org] KMS Key {f.resource} in {f.region} has cross-organization access: {', '.join(f.principals)}"
+        return f"    [Cross-Account] KMS Key {f.resource} in {f.region} has cross-account access: {', '.join(f.principals)}"
+    if f.scanner == 's3':
+        if f.kind == 'bucket-policy':
+            return "  [!] Cross-account or organization permission in bucket policy:\n" + json.dumps(f.detail, indent=2)
+        if f.kind == 'bucket-acl':
+            return "  [!] Cross-account or group permissions in bucket ACL:\n" + _acl_lines(f.principals)
+        return f"  [!] Object '{f.detail}' has cross-account or group permissions in ACL:\n" + _acl_lines(f.principals)
+    if f.scanner == 'lambda':
+        return f"Region: {f.region} | Function: {f.resource} | Cross-account/org policy: {json.dumps(f.detail)}"
+    if f.scanner == 'iam':
+        role = f"Role '{f.resource}' can be assumed by"
+        if f.kind == 'public':
+            return f"{role} any AWS principal (public)"
+        if f.kind == 'cross-account':
+            return f"{role} account {', '.join(f.principals)} (cross-account)"
+        if f.kind == 'cross-org':
+            return f"{role} organization {', '.join(f.principals)} (cross-organization)"
+        return f"{role} another account in this organization (cross-org, same org)"
+    if f.scanner == 'events':
+        return f"  Event bus '{f.resource}' has cross-account or org policy:\n" + json.dumps(f.detail, indent=2)
+    return f"{f.scanner} {f.kind} {f.region} {f.resource}: {', '.join(f.principals)}"
+
+class FindingWriter:
+    """Print findings as text and, if a path was given, stream them to a JSONL file as produced."""
+
+    def __init__(self, jsonl_path=None, text=True):
+        self.text = text
+        self.sink = JsonlSink(jsonl_path, FIELDS) if jsonl_path else None
+        self._lock = threading.Lock()
+
+    def emit(self, finding):
+        if self.text:
+            print(render_text(finding))
+        if self.sink:
+            with self._lock:
+                self.sink.write(finding._asdict())
+
+    def close(self):
+        if self.sink:
+            self.sink.close()
+
+_writer = FindingWriter()
+
+def open_jsonl(path, text=True):
+    """Send every finding emitted from now on to `path` as JSONL as well."""
+    global _writer
+    _writer = FindingWriter(path, text)
+    return _writer
+
+def emit(finding):
+    _writer.emit(finding)
+
+def close():
+    _writer.close()
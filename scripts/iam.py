@@ -1,9 +1,13 @@
-import boto3
-import json
+import argparse
+
+from clients import get_client
+from findings import Finding, emit, from_rows, to_rows
+from policy_analysis import analyze_identity_policy, analyze_policy, policy_digest
+import snapshot_store
 
 def get_current_account_and_org():
-    sts = boto3.client('sts')
-    org = boto3.client('organizations')
+    sts = get_client('sts')
+    org = get_client('organizations')
     account_id = sts.get_caller_identity()['Account']
     try:
         org_id = org.describe_organization()['Organization']['Id']
@@ -11,59 +15,123 @@ def get_current_account_and_org():
         org_id = None  # Not in an organization
     return account_id, org_id
 
-def extract_account_id_from_arn(arn):
-    # arn:aws:iam::123456789012:role/SomeRole
-    parts = arn.split(':')
-    if len(parts) > 4:
-        return parts[4]
-    return None
+def classify_trust_policy(role_name, assume_policy, current_account_id, current_org_id):
+    findings = []
+    for analysis in analyze_policy(assume_policy, current_account_id, current_org_id):
+        if analysis.public:
+            findings.append(Finding('iam', 'public', current_account_id, None, role_name, ('*',)))
+        for acct_id in analysis.external_accounts:
+            findings.append(Finding('iam', 'cross-account', current_account_id, None, role_name, (acct_id,)))
+        for org_id in analysis.org_ids:
+            kind = 'cross-org' if org_id != current_org_id else 'same-org'
+            findings.append(Finding('iam', kind, current_account_id, None, role_name, (org_id,)))
+    return findings
 
-def extract_org_id_from_arn(arn):
-    # arn:aws:iam::123456789012:role/SomeRole
-    # arn:aws:iam::123456789012:role/OrganizationAccountAccessRole
-    # arn:aws:organizations::123456789012:organization/o-xxxxxxxxxx
-    if ":organization/" in arn:
-        return arn.split("/")[-1]
-    return None
+def classify_identity_policy(owner, policy_name, document, current_account_id):
+    findings = []
+    for access in analyze_identity_policy(document, current_account_id):
+        if access.any_account:
+            findings.append(f"{owner} policy '{policy_name}' allows sts:AssumeRole on any role ('*'), including other accounts")
+        for acct_id in access.external_accounts:
+            if access.assume_role:
+                findings.append(f"{owner} policy '{policy_name}' allows sts:AssumeRole into account {acct_id} (cross-account)")
+            else:
+                findings.append(f"{owner} policy '{policy_name}' grants access to resources in account {acct_id} (cross-account)")
+    return findings
 
-def is_cross_account(principal, current_account_id):
-    if isinstance(principal, str):
-        return principal != f"arn:aws:iam::{current_account_id}:root"
-    elif isinstance(principal, list):
-        return any(is_cross_account(p, current_account_id) for p in principal)
-    elif isinstance(principal, dict):
-        return any(is_cross_account(p, current_account_id) for p in principal.values())
-    return False
+def role_trust_findings(role, current_account_id, current_org_id, store=None):
+    assume_policy = role['AssumeRolePolicyDocument']
+    marker = policy_digest(assume_policy)
+    rows = store.lookup(role['Arn'], marker) if store else None
+    if rows is not None:
+        return from_rows(rows)
+    findings = classify_trust_policy(role['RoleName'], assume_policy, current_account_id, current_org_id)
+    if store:
+        store.put(role['Arn'], 'iam', marker, to_rows(findings))
+    return findings
 
-def main():
-    current_account_id, current_org_id = get_current_account_and_org()
-    iam = boto3.client('iam')
+def scan_roles(iam, current_account_id, current_org_id, store=None):
     paginator = iam.get_paginator('list_roles')
-    print(f"Current Account: {current_account_id}, Organization: {current_org_id}")
     for response in paginator.paginate():
         for role in response['Roles']:
-            role_name = role['RoleName']
-            assume_policy = role['AssumeRolePolicyDocument']
-            for stmt in assume_policy.get('Statement', []):
-                if stmt.get('Effect') != 'Allow':
-                    continue
-                principal = stmt.get('Principal', {}).get('AWS')
-                if not principal:
-                    continue
-                # Normalize to list
-                if isinstance(principal, str):
-                    principal = [principal]
-                for arn in principal:
-                    if arn.startswith("arn:aws:iam::"):
-                        acct_id = extract_account_id_from_arn(arn)
-                        if acct_id and acct_id != current_account_id:
-                            print(f"Role '{role_name}' can be assumed by account {acct_id} (cross-account)")
-                    elif arn.startswith("arn:aws:organizations::"):
-                        org_id = extract_org_id_from_arn(arn)
-                        if org_id and org_id != current_org_id:
-                            print(f"Role '{role_name}' can be assumed by organization {org_id} (cross-organization)")
-                        elif org_id and org_id == current_org_id:
-                            print(f"Role '{role_name}' can be assumed by another account in this organization (cross-org, same org)")
+            for finding in role_trust_findings(role, current_account_id, current_org_id, store):
+                emit(finding)
+
+def scan_authorization_details(iam, current_account_id, current_org_id, store=None):
+    """Report trust, inline and customer-managed policy findings from get_account_authorization_details.
+
+    One paginated pass returns every user, group and role with its inline and
+    attached policies, plus each customer-managed policy with its versions, so
+    the whole account costs a few dozen calls instead of one per policy.
+    Managed policies are classified once per (ARN, default version) and
+    reported with the principals they are attached to. Only customer-managed
+    policies (LocalManagedPolicy) are classified; AWS managed policies are not
+    returned by this filter and are not checked.
+    """
+    paginator = iam.get_paginator('get_account_authorization_details')
+    attachments = {}
+    managed = {}
+    pages = paginator.paginate(Filter=['User', 'Group', 'Role', 'LocalManagedPolicy'])
+    for page in pages:
+        for kind, details, policies_key, name_key in (
+            ('User', page.get('UserDetailList', []), 'UserPolicyList', 'UserName'),
+            ('Group', page.get('GroupDetailList', []), 'GroupPolicyList', 'GroupName'),
+            ('Role', page.get('RoleDetailList', []), 'RolePolicyList', 'RoleName')
+        ):
+            for detail in details:
+                owner = f"{kind} '{detail[name_key]}'"
+                if kind == 'Role':
+                    for finding in role_trust_findings(detail, current_account_id, current_org_id, store):
+                        emit(finding)
+                for inline in detail.get(policies_key, []):
+                    for finding in classify_identity_policy(
+                        owner, inline['PolicyName'], inline['PolicyDocument'], current_account_id
+                    ):
+                        print(finding)
+                for attached in detail.get('AttachedManagedPolicies', []):
+                    attachments.setdefault(attached['PolicyArn'], []).append(owner)
+
+        for policy in page.get('Policies', []):
+            key = (policy['Arn'], policy['DefaultVersionId'])
+            if key in managed:
+                continue
+            for version in policy.get('PolicyVersionList', []):
+                if version['IsDefaultVersion']:
+                    managed[key] = classify_identity_policy(
+                        'Managed', policy['PolicyName'], version['Document'], current_account_id
+                    )
+                    break
+
+    # Attachments are only complete once every page has been read
+    for (policy_arn, version_id), findings in managed.items():
+        if not findings:
+            continue
+        attached_to = ', '.join(attachments.get(policy_arn, [])) or 'nothing'
+        for finding in findings:
+            print(f"{finding} [{version_id}, attached to {attached_to}]")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Scan IAM role trust policies for cross-account and organization access.")
+    parser.add_argument('--mode', choices=['roles', 'authorization-details'], default='roles',
+                        help="'roles' checks role trust policies only; 'authorization-details' also checks "
+                             "inline and customer-managed policies (not AWS managed ones) in one bulk "
+                             "get_account_authorization_details pass")
+    snapshot_store.add_arguments(parser)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    store = snapshot_store.open_store(args)
+    current_account_id, current_org_id = get_current_account_and_org()
+    iam = get_client('iam')
+    print(f"Current Account: {current_account_id}, Organization: {current_org_id}")
+    if args.mode == 'authorization-details':
+        scan_authorization_details(iam, current_account_id, current_org_id, store)
+    else:
+        scan_roles(iam, current_account_id, current_org_id, store)
+    if store:
+        print(store.summary())
+        store.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
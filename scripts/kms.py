@@ -1,62 +1,138 @@
-import boto3
-import json
-import re
+import argparse
+import time
+
 from botocore.exceptions import ClientError
 
+from async_engine import call_many
+from clients import get_client, set_max_pool_connections
+from fanout import iter_regions
+from findings import Finding, emit, from_rows, to_rows
+from policy_analysis import access_principals, analyze_policy, policy_digest
+from regions import get_enabled_regions
+import snapshot_store
+
 def get_account_id():
-    sts = boto3.client('sts')
+    sts = get_client('sts')
     return sts.get_caller_identity()['Account']
 
 def get_org_id():
     try:
-        org = boto3.client('organizations')
+        org = get_client('organizations')
         response = org.describe_organization()
         return response['Organization']['Id']
     except ClientError as e:
         print("Warning: Could not retrieve Organization ID. Are you in an AWS Organization?")
         return None
 
-def get_enabled_regions():
-    ec2 = boto3.client('ec2')
-    response = ec2.describe_regions(AllRegions=False)
-    return [r['RegionName'] for r in response['Regions'] if r.get('OptInStatus') in ('opt-in-not-required', 'opted-in')]
-
-def get_kms_keys(region_name):
-    kms = boto3.client('kms', region_name=region_name)
+def get_kms_keys(kms):
     paginator = kms.get_paginator('list_keys')
     keys = []
     for page in paginator.paginate():
         keys.extend(page['Keys'])
     return keys
 
-def get_key_policy(kms, key_id):
-    response = kms.get_key_policy(KeyId=key_id, PolicyName='default')
-    return json.loads(response['Policy'])
-
-def is_cross_account(principal, my_account_id):
-    arn_pattern = r'arn:aws:iam::(\d+):'
-    if isinstance(principal, str):
-        match = re.match(arn_pattern, principal)
-        return match and match.group(1) != my_account_id
-    elif isinstance(principal, list):
-        return any(is_cross_account(p, my_account_id) for p in principal)
-    elif isinstance(principal, dict):
-        return any(is_cross_account(v, my_account_id) for v in principal.values())
-    return False
-
-def is_cross_org(statement, my_org_id):
-    if not my_org_id:
-        return False
-    condition = statement.get('Condition', {})
-    for key, value in condition.items():
-        if 'aws:PrincipalOrgID' in value:
-            if isinstance(value['aws:PrincipalOrgID'], str):
-                return value['aws:PrincipalOrgID'] != my_org_id
-            elif isinstance(value['aws:PrincipalOrgID'], list):
-                return any(org_id != my_org_id for org_id in value['aws:PrincipalOrgID'])
-    return False
-
-def main():
+def classify_key_policy(policy, key_id, region, my_account_id, my_org_id):
+    findings = []
+    for analysis in analyze_policy(policy, my_account_id, my_org_id):
+        if analysis.external_accounts or analysis.public:
+            findings.append(Finding('kms', 'cross-account', my_account_id, region, key_id, access_principals(analysis)))
+        if analysis.cross_org:
+            findings.append(Finding('kms', 'cross-org', my_account_id, region, key_id, analysis.org_ids))
+    return findings
+
+def index_aws_managed_keys(kms):
+    """Return the IDs of AWS-managed keys, found from their alias/aws/* aliases in one paginated pass."""
+    managed = set()
+    paginator = kms.get_paginator('list_aliases')
+    for page in paginator.paginate():
+        for alias in page['Aliases']:
+            if alias['AliasName'].startswith('alias/aws/') and alias.get('TargetKeyId'):
+                managed.add(alias['TargetKeyId'])
+    return managed
+
+def key_error(key, region, my_account_id, error):
+    return Finding('kms', 'error', my_account_id, region, key['KeyId'], (),
+                   f"Could not get policy for key {key['KeyId']}: {error}")
+
+def scan_kms_region(region, my_account_id, my_org_id, store=None, key_workers=8, skip_pending=False):
+    kms = get_client('kms', region)
+    started_at = time.time()
+    scope = f"kms:{my_account_id}:{region}"
+    # Key policies only change through PutKeyPolicy, so with a previous scan on
+    # record only keys named in those CloudTrail events need to be refetched
+    changed, history_error = (
+        snapshot_store.changed_since(region, ['PutKeyPolicy'], store.last_scan(scope)) if store else (None, None)
+    )
+    keys = get_kms_keys(kms)
+    managed = index_aws_managed_keys(kms)
+    customer_keys = [key for key in keys if key['KeyId'] not in managed]
+    stats = {
+        'keys': len(keys),
+        'pruned_managed': len(keys) - len(customer_keys),
+        'pruned_pending': 0,
+        'reused': 0,
+        'fetched': 0
+    }
+    results = {}
+    to_fetch = []
+    for key in customer_keys:
+        rows = store.lookup(key['KeyArn']) if changed is not None and key['KeyId'] not in changed else None
+        if rows is not None:
+            stats['reused'] += 1
+            results[key['KeyId']] = from_rows(rows)
+        else:
+            to_fetch.append(key)
+
+    # Both batches run on a pool of key_workers threads, or on the async
+    # engine when it is enabled
+    if skip_pending:
+        states = call_many(kms, 'describe_key', [{'KeyId': key['KeyId']} for key in to_fetch], workers=key_workers)
+        remaining = []
+        for key, (response, error) in zip(to_fetch, states):
+            if error is not None:
+                stats['fetched'] += 1
+                results[key['KeyId']] = [key_error(key, region, my_account_id, error)]
+            elif response['KeyMetadata']['KeyState'] == 'PendingDeletion':
+                stats['pruned_pending'] += 1
+            else:
+                remaining.append(key)
+        to_fetch = remaining
+
+    policies = call_many(
+        kms, 'get_key_policy', [{'KeyId': key['KeyId'], 'PolicyName': 'default'} for key in to_fetch],
+        workers=key_workers
+    )
+    for key, (response, error) in zip(to_fetch, policies):
+        stats['fetched'] += 1
+        if error is not None:
+            results[key['KeyId']] = [key_error(key, region, my_account_id, error)]
+            continue
+        policy = response['Policy']
+        findings = classify_key_policy(policy, key['KeyId'], region, my_account_id, my_org_id)
+        if store:
+            store.put(key['KeyArn'], 'kms', policy_digest(policy), to_rows(findings))
+        results[key['KeyId']] = findings
+
+    region_findings = []
+    for key in customer_keys:
+        region_findings.extend(results.get(key['KeyId'], []))
+    if store:
+        store.finish_scan(scope, started_at)
+    return stats, region_findings, history_error
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Scan KMS key policies for cross-account and cross-organization access.")
+    parser.add_argument('--key-workers', type=int, default=8, help="Concurrent get_key_policy calls per region without the async engine (default: 8)")
+    parser.add_argument('--skip-pending-deletion', action='store_true',
+                        help="Skip keys pending deletion; KMS has no bulk key-state API, so this costs one "
+                             "describe_key call per customer-managed key")
+    snapshot_store.add_arguments(parser)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    set_max_pool_connections(args.key_workers)
+    store = snapshot_store.open_store(args)
     my_account_id = get_account_id()
     my_org_id = get_org_id()
     print(f"Detected AWS Account ID: {my_account_id}")
@@ -65,44 +141,48 @@ def main():
     else:
         print("No AWS Organization detected or insufficient permissions.")
 
-    regions = get_enabled_regions()
+    regions = get_enabled_regions('kms')
     print(f"Enabled regions: {regions}")
 
-    total_keys = 0
-    cross_account_findings = []
-    cross_org_findings = []
-
-    for region in regions:
-        print(f"\nChecking region: {region}")
-        kms = boto3.client('kms', region_name=region)
-        keys = get_kms_keys(region)
-        print(f"  Found {len(keys)} KMS keys.")
-        total_keys += len(keys)
-        for key in keys:
-            key_id = key['KeyId']
-            try:
-                policy = get_key_policy(kms, key_id)
-            except Exception as e:
-                print(f"    Could not get policy for key {key_id}: {e}")
-                continue
-            for statement in policy.get('Statement', []):
-                principal = statement.get('Principal', {}).get('AWS')
-                if principal and is_cross_account(principal, my_account_id):
-                    finding = f"    [Cross-Account] KMS Key {key_id} in {region} has cross-account access: {principal}"
-                    print(finding)
-                    cross_account_findings.append(finding)
-                if is_cross_org(statement, my_org_id):
-                    finding = f"    [Cross-Org] KMS Key {key_id} in {region} has cross-organization access: {statement.get('Condition')}"
-                    print(finding)
-                    cross_org_findings.append(finding)
+    totals = {'keys': 0, 'pruned_managed': 0, 'pruned_pending': 0, 'reused': 0, 'fetched': 0}
+    finding_counts = {'cross-account': 0, 'cross-org': 0, 'error': 0}
+
+    region_results = iter_regions(
+        regions, scan_kms_region, my_account_id, my_org_id, store,
+        key_workers=args.key_workers, skip_pending=args.skip_pending_deletion
+    )
+    for region_result in region_results:
+        print(f"\nChecking region: {region_result.region}")
+        if region_result.error is not None:
+            print(f"  Error scanning region {region_result.region}: {region_result.error}")
+            continue
+        stats, region_findings, history_error = region_result.result
+        if history_error is not None:
+            print(snapshot_store.history_warning(region_result.region, history_error))
+        print(f"  Found {stats['keys']} KMS keys ({stats['pruned_managed']} AWS managed skipped).")
+        for name, count in stats.items():
+            totals[name] += count
+        for finding in region_findings:
+            finding_counts[finding.kind] += 1
+            emit(finding)
 
     print("\n=== SUMMARY ===")
     print(f"Total regions checked: {len(regions)}")
-    print(f"Total KMS keys checked: {total_keys}")
-    print(f"Cross-account findings: {len(cross_account_findings)}")
-    print(f"Cross-organization findings: {len(cross_org_findings)}")
+    print(f"Total KMS keys found: {totals['keys']}")
+    print(f"AWS managed keys pruned: {totals['pruned_managed']}")
+    if args.skip_pending_deletion:
+        print(f"Keys pending deletion pruned: {totals['pruned_pending']}")
+    print(f"Key policies fetched: {totals['fetched']}")
+    if store:
+        print(f"Key policies reused from snapshot store: {totals['reused']}")
+    print(f"Cross-account findings: {finding_counts['cross-account']}")
+    print(f"Cross-organization findings: {finding_counts['cross-org']}")
+
+    if store:
+        print(store.summary())
+        store.close()
 
-    if not cross_account_findings and not cross_org_findings:
+    if not finding_counts['cross-account'] and not finding_counts['cross-org']:
         print("No cross-account or cross-organization access detected in any KMS key policies.")
 
 if __name__ == "__main__":
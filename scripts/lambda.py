@@ -1,50 +1,98 @@
-import boto3
+import argparse
 import json
-import re
-
-def is_cross_account(principal, org_account_ids=None):
-    if principal == "*" or principal == {"AWS": "*"}:
-        return True
-    if isinstance(principal, dict) and "AWS" in principal:
-        aws_principal = principal["AWS"]
-        if isinstance(aws_principal, list):
-            return any(is_cross_account(p, org_account_ids) for p in aws_principal)
-        m = re.match(r"arn:aws:iam::(\d{12}):root", aws_principal)
-        if m:
-            account_id = m.group(1)
-            if org_account_ids and account_id in org_account_ids:
-                return False
-            return True
-    return False
-
-def get_all_regions():
-    ec2 = boto3.client('ec2')
-    regions = ec2.describe_regions(AllRegions=False)
-    return [r['RegionName'] for r in regions['Regions']]
-
-def main():
-    regions = get_all_regions()
-    for region in regions:
-        print(f"Checking region: {region}")
-        lambda_client = boto3.client('lambda', region_name=region)
+import os
+
+from botocore.exceptions import ClientError
+
+from async_engine import call_many
+from clients import get_client
+from fanout import run_in_regions
+from findings import Finding, emit, from_rows, to_rows
+from policy_analysis import access_principals, analyze_policy, policy_statements
+from regions import get_enabled_regions
+import snapshot_store
+
+POLICY_WORKERS = int(os.environ.get('LAMBDA_POLICY_WORKERS', '8'))
+
+def classify_function_policy(policy, fn_name, region, account_id):
+    analyses = analyze_policy(policy, account_id)
+    if not analyses:
+        return []
+    statements = policy_statements(json.loads(policy))
+    return [
+        Finding('lambda', 'cross-account', account_id, region, fn_name, access_principals(analysis),
+                statements[analysis.index])
+        for analysis in analyses
+    ]
+
+def scan_lambda_region(region, account_id, store=None):
+    """Classify the resource policy of every function in the region.
+
+    Functions whose RevisionId matches the snapshot store are reused; the
+    policies of the rest are fetched as one batch, concurrently on a pool of
+    POLICY_WORKERS threads or on the async engine when it is enabled.
+    """
+    lambda_client = get_client('lambda', region)
+    functions = []
+    try:
         paginator = lambda_client.get_paginator('list_functions')
-        try:
-            for page in paginator.paginate():
-                for function in page['Functions']:
-                    fn_name = function['FunctionName']
-                    try:
-                        policy_response = lambda_client.get_policy(FunctionName=fn_name)
-                        policy = json.loads(policy_response['Policy'])
-                        for stmt in policy.get('Statement', []):
-                            principal = stmt.get('Principal')
-                            if is_cross_account(principal):
-                                print(f"Region: {region} | Function: {fn_name} | Cross-account/org policy: {json.dumps(stmt)}")
-                    except lambda_client.exceptions.ResourceNotFoundException:
-                        continue  # No policy attached
-                    except Exception as e:
-                        print(f"Error processing function {fn_name} in {region}: {e}")
-        except Exception as e:
-            print(f"Error listing functions in region {region}: {e}")
+        for page in paginator.paginate():
+            functions.extend(page['Functions'])
+    except Exception as e:
+        return [Finding('lambda', 'error', account_id, region, None, (),
+                        f"Error listing functions in region {region}: {e}")]
+
+    results = {}
+    to_fetch = []
+    for function in functions:
+        # RevisionId changes whenever the function or its policy is updated
+        rows = store.lookup(function['FunctionArn'], function.get('RevisionId')) if store else None
+        if rows is not None:
+            results[function['FunctionArn']] = from_rows(rows)
+        else:
+            to_fetch.append(function)
+
+    responses = call_many(lambda_client, 'get_policy', [{'FunctionName': f['FunctionName']} for f in to_fetch],
+                          workers=POLICY_WORKERS)
+    for function, (response, error) in zip(to_fetch, responses):
+        fn_name = function['FunctionName']
+        if error is None:
+            findings = classify_function_policy(response['Policy'], fn_name, region, account_id)
+        elif isinstance(error, ClientError) and error.response['Error']['Code'] == 'ResourceNotFoundException':
+            findings = []  # No policy attached
+        else:
+            results[function['FunctionArn']] = [Finding('lambda', 'error', account_id, region, fn_name, (),
+                                                        f"Error processing function {fn_name} in {region}: {error}")]
+            continue
+        if store:
+            store.put(function['FunctionArn'], 'lambda', function.get('RevisionId'), to_rows(findings))
+        results[function['FunctionArn']] = findings
+
+    region_findings = []
+    for function in functions:
+        region_findings.extend(results[function['FunctionArn']])
+    return region_findings
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Scan Lambda function policies for cross-account and organization access.")
+    snapshot_store.add_arguments(parser)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    store = snapshot_store.open_store(args)
+    account_id = get_client('sts').get_caller_identity()['Account']
+    regions = get_enabled_regions('lambda')
+    for region_result in run_in_regions(regions, scan_lambda_region, account_id, store):
+        print(f"Checking region: {region_result.region}")
+        if region_result.error is not None:
+            print(f"Error scanning region {region_result.region}: {region_result.error}")
+            continue
+        for finding in region_result.result:
+            emit(finding)
+    if store:
+        print(store.summary())
+        store.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
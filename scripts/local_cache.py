@@ -0,0 +1,53 @@
+import json
+import os
+import tempfile
+import threading
+import time
+
+CACHE_DIR = os.environ.get(
+    'AWS_ORG_MIGRATION_CACHE_DIR',
+    os.path.join(os.path.expanduser('~'), '.cache', 'aws-org-migration')
+)
+
+def cache_path(name):
+    return os.path.join(CACHE_DIR, name)
+
+def load_json(name, default=None, max_age=None):
+    """Load a cached JSON document, or return `default` if missing, unreadable or older than `max_age` seconds."""
+    path = cache_path(name)
+    try:
+        if max_age is not None and time.time() - os.path.getmtime(path) > max_age:
+            return default
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+def save_json(name, data):
+    """Atomically write a JSON document to the cache directory."""
+    path = cache_path(name)
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    # Unique per call, so concurrent writers in any thread or process never share a temporary file
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, indent=1, sort_keys=True, default=str)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+_update_lock = threading.Lock()
+
+def update_json(name, updates):
+    """Merge the `updates` dict into a cached JSON object and return the merged result.
+
+    The load, merge and save happen under a process-wide lock, so concurrent
+    account scans updating the same cache do not drop each other's entries.
+    """
+    with _update_lock:
+        data = load_json(name, default={})
+        data.update(updates)
+        save_json(name, data)
+        return data
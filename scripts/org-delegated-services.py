@@ -1,19 +1,28 @@
-import boto3
+from clients import get_client
 
-org = boto3.client('organizations')
+def list_delegated_administrators():
+    """Return [(admin account, [delegated service principals])] for the organization."""
+    org = get_client('organizations')
+    delegated = []
+    paginator = org.get_paginator('list_delegated_administrators')
+    for page in paginator.paginate():
+        for admin in page['DelegatedAdministrators']:
+            services = []
+            services_paginator = org.get_paginator('list_delegated_services_for_account')
+            for services_page in services_paginator.paginate(AccountId=admin['Id']):
+                services.extend(svc['ServicePrincipal'] for svc in services_page['DelegatedServices'])
+            delegated.append((admin, services))
+    return delegated
 
-# Get all delegated administrators
-delegated_admins = org.list_delegated_administrators()['DelegatedAdministrators']
+def main():
+    print("Delegated Administrator Accounts and Their Services:")
+    for admin, services in list_delegated_administrators():
+        print(f"\nAccount ID: {admin['Id']} | Email: {admin['Email']}")
+        if services:
+            for service in services:
+                print(f"  - Service: {service}")
+        else:
+            print("  - No delegated services found.")
 
-print("Delegated Administrator Accounts and Their Services:")
-for admin in delegated_admins:
-    account_id = admin['Id']
-    account_email = admin['Email']
-    print(f"\nAccount ID: {account_id} | Email: {account_email}")
-    # List delegated services for this account
-    services = org.list_delegated_services_for_account(AccountId=account_id)['DelegatedServices']
-    if services:
-        for svc in services:
-            print(f"  - Service: {svc['ServicePrincipal']}")
-    else:
-        print("  - No delegated services found.")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,7 @@
-import boto3
+from clients import get_client
 
-def list_enabled_policy_types():
-    client = boto3.client('organizations')
+def get_enabled_policy_types():
+    client = get_client('organizations')
 
     # Get the root ID and policy types of the organization
     roots = client.list_roots()
@@ -11,11 +11,16 @@ def list_enabled_policy_types():
     # Get enabled policy types for the root
     policy_types = root.get('PolicyTypes', [])
 
-    enabled_types = [pt['Type'] for pt in policy_types if pt['Status'] == 'ENABLED']
+    return [pt['Type'] for pt in policy_types if pt['Status'] == 'ENABLED']
 
+def list_enabled_policy_types():
+    enabled_types = get_enabled_policy_types()
     print("Enabled AWS Organizations Policy Types:")
     for policy_type in enabled_types:
         print(f"- {policy_type}")
 
+def main():
+    list_enabled_policy_types()
+
 if __name__ == "__main__":
-    list_enabled_policy_types()
\ No newline at end of file
+    main()
\ No newline at end of file
@@ -1,7 +1,7 @@
-import boto3
+from clients import get_client
 
-def list_trusted_services():
-    client = boto3.client('organizations')
+def get_trusted_services():
+    client = get_client('organizations')
     trusted_services = []
     next_token = None
 
@@ -15,10 +15,16 @@ def list_trusted_services():
         next_token = response.get('NextToken')
         if not next_token:
             break
+    return trusted_services
 
+def list_trusted_services():
+    trusted_services = get_trusted_services()
     print("Services with trusted access enabled:")
     for service in trusted_services:
         print(f"- Service Principal: {service['ServicePrincipal']}, Enabled At: {service['DateEnabled']}")
 
+def main():
+    list_trusted_services()
+
 if __name__ == "__main__":
-    list_trusted_services()
\ No newline at end of file
+    main()
\ No newline at end of file
@@ -0,0 +1,96 @@
+import argparse
+import contextvars
+import inspect
+import io
+import sys
+
+from accounts import DEFAULT_ROLE_NAME, CredentialCache, iter_for_accounts, list_org_accounts
+from fanout import set_global_concurrency
+from scanners import load_scanner
+
+# Output buffer of the account whose scan is running in this context
+account_output = contextvars.ContextVar('account_output', default=None)
+
+class ContextStdout:
+    """sys.stdout replacement that sends prints from an account's scan to that account's buffer."""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, text):
+        buffer = account_output.get()
+        if buffer is None:
+            return self.stream.write(text)
+        return buffer.write(text)
+
+    def flush(self):
+        if account_output.get() is None:
+            self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+def scan_account(account_id, main, script_args):
+    buffer = io.StringIO()
+    token = account_output.set(buffer)
+    error = None
+    try:
+        if inspect.signature(main).parameters:
+            main(script_args)
+        else:
+            main()
+    except Exception as e:
+        error = e
+    finally:
+        account_output.reset(token)
+    return buffer.getvalue(), error
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Run a scanner in every account of the organization by assuming a role in each one."
+    )
+    parser.add_argument('script', help="Scanner to run, e.g. kms or kms.py")
+    parser.add_argument('script_args', nargs=argparse.REMAINDER, help="Arguments passed through to the scanner")
+    parser.add_argument('--role', default=DEFAULT_ROLE_NAME, help=f"Role to assume in each account (default: {DEFAULT_ROLE_NAME})")
+    parser.add_argument('--accounts', help="Comma-separated account IDs to scan (default: every active account)")
+    parser.add_argument('--exclude-accounts', default='', help="Comma-separated account IDs to skip")
+    parser.add_argument('--account-workers', type=int, default=4, help="Accounts scanned concurrently (default: 4)")
+    parser.add_argument('--max-concurrency', type=int, default=32,
+                        help="Cap on account x region work units running at once across all accounts (default: 32)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    scanner_main = load_scanner(args.script)
+
+    accounts = list_org_accounts()
+    if args.accounts:
+        wanted = set(args.accounts.split(','))
+        accounts = [a for a in accounts if a['Id'] in wanted]
+    excluded = set(filter(None, args.exclude_accounts.split(',')))
+    accounts = [a for a in accounts if a['Id'] not in excluded]
+    print(f"Scanning {len(accounts)} accounts with {args.script} as role {args.role}")
+
+    set_global_concurrency(args.max_concurrency)
+    credentials = CredentialCache(role_name=args.role)
+    stdout = sys.stdout
+    sys.stdout = ContextStdout(stdout)
+    failures = 0
+    try:
+        for result in iter_for_accounts(accounts, scan_account, scanner_main, args.script_args,
+                                        credentials=credentials, max_workers=args.account_workers):
+            output, error = result.result if result.error is None else ('', result.error)
+            for line in output.splitlines():
+                stdout.write(f"[{result.account_id}] {line}\n" if line else "\n")
+            if error is not None:
+                failures += 1
+                stdout.write(f"[{result.account_id}] Error scanning account {result.account_id} ({result.account_name}): {error}\n")
+            stdout.flush()
+    finally:
+        sys.stdout = stdout
+
+    print(f"\nAccounts scanned: {len(accounts)}, failed: {failures}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,302 @@
+import hashlib
+import json
+import re
+import threading
+from collections import OrderedDict, namedtuple
+from fnmatch import fnmatchcase
+from functools import lru_cache
+
+ARN_RE = re.compile(r'^arn:(?P<partition>[^:]*):(?P<service>[^:]*):(?P<region>[^:]*):(?P<account>[^:]*):(?P<resource>.*)$')
+ACCOUNT_ID_RE = re.compile(r'^\d{12}$')
+ORG_ID_RE = re.compile(r'^o-[a-z0-9]{10,32}$')
+
+# Condition keys (lower-cased, as IAM compares them case-insensitively) that
+# pin a wildcard principal to specific accounts or organizations. Network keys
+# such as aws:SourceIp and aws:SourceVpc do not, and ARN keys only do when the
+# ARN names a concrete account.
+ACCOUNT_CONDITION_KEYS = frozenset(['aws:principalaccount', 'aws:sourceaccount', 'aws:sourceowner', 'kms:calleraccount'])
+ORG_CONDITION_KEYS = frozenset(['aws:principalorgid', 'aws:sourceorgid'])
+ORG_PATH_CONDITION_KEYS = frozenset(['aws:principalorgpaths', 'aws:sourceorgpaths'])
+ARN_CONDITION_KEYS = frozenset(['aws:sourcearn', 'aws:principalarn'])
+
+CACHE_SIZE = 4096
+
+Arn = namedtuple('Arn', ['partition', 'service', 'region', 'account', 'resource'])
+
+# Compact, hashable form of a policy statement. `principals` holds
+# (type, value) pairs, e.g. ('AWS', 'arn:aws:iam::111122223333:root'), and
+# `conditions` holds (operator, lower-cased key, values) triples. `negated`,
+# `not_action` and `not_resource` mark NotPrincipal, NotAction and
+# NotResource statements, whose listed values are the ones excluded.
+Statement = namedtuple('Statement', [
+    'sid', 'effect', 'negated', 'principals', 'actions', 'not_action', 'resources', 'not_resource', 'conditions'
+])
+
+# Access granted by one Allow statement, relative to the analyzing account.
+# `index` points back into the policy's Statement list.
+StatementAnalysis = namedtuple('StatementAnalysis', [
+    'index', 'sid', 'external_accounts', 'public', 'org_ids', 'cross_org'
+])
+
+# Access an identity policy statement grants to resources outside the account.
+# `assume_role` is set when it allows sts:AssumeRole on roles elsewhere, and
+# `any_account` when that includes a wildcard resource.
+ResourceAccess = namedtuple('ResourceAccess', [
+    'index', 'sid', 'external_accounts', 'assume_role', 'any_account'
+])
+
+ASSUME_ROLE_ACTIONS = ('sts:assumerole', 'sts:assumerolewithsaml', 'sts:assumerolewithwebidentity')
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_arn(arn):
+    match = ARN_RE.match(arn)
+    if not match:
+        return None
+    return Arn(**match.groupdict())
+
+def principal_account(value):
+    """Return the account ID a principal string refers to, or None (e.g. for "*" or a service)."""
+    if ACCOUNT_ID_RE.match(value):
+        return value
+    arn = parse_arn(value)
+    if arn and ACCOUNT_ID_RE.match(arn.account):
+        return arn.account
+    return None
+
+def principal_org_id(value):
+    # arn:aws:organizations::123456789012:organization/o-xxxxxxxxxx
+    arn = parse_arn(value)
+    if arn and arn.service == 'organizations' and arn.resource.startswith('organization/'):
+        return arn.resource.split('/')[-1]
+    return None
+
+def _as_tuple(value):
+    if value is None:
+        return ()
+    if isinstance(value, (list, tuple)):
+        return tuple(str(v) for v in value)
+    return (str(value),)
+
+def normalize_principals(principal):
+    if principal is None:
+        return ()
+    if principal == '*':
+        return (('AWS', '*'),)
+    if isinstance(principal, dict):
+        return tuple(
+            (principal_type, value)
+            for principal_type, values in sorted(principal.items())
+            for value in _as_tuple(values)
+        )
+    return tuple(('AWS', value) for value in _as_tuple(principal))
+
+def normalize_conditions(condition):
+    conditions = []
+    for operator, clauses in sorted((condition or {}).items()):
+        if not isinstance(clauses, dict):
+            continue
+        for key, values in sorted(clauses.items()):
+            conditions.append((operator, key.lower(), _as_tuple(values)))
+    return tuple(conditions)
+
+def normalize_statement(statement):
+    negated = 'NotPrincipal' in statement
+    not_action = 'NotAction' in statement
+    not_resource = 'NotResource' in statement
+    return Statement(
+        sid=statement.get('Sid'),
+        effect=statement.get('Effect', 'Allow'),
+        negated=negated,
+        principals=normalize_principals(statement.get('NotPrincipal') if negated else statement.get('Principal')),
+        actions=_as_tuple(statement.get('NotAction') if not_action else statement.get('Action')),
+        not_action=not_action,
+        resources=_as_tuple(statement.get('NotResource') if not_resource else statement.get('Resource')),
+        not_resource=not_resource,
+        conditions=normalize_conditions(statement.get('Condition'))
+    )
+
+def policy_statements(document):
+    """Return a policy's Statement element as a list (a single statement may be a bare object)."""
+    statements = document.get('Statement', [])
+    return [statements] if isinstance(statements, dict) else list(statements)
+
+def normalize_policy(document):
+    return tuple(normalize_statement(s) for s in policy_statements(document))
+
+def _scoping(operator):
+    # A negated operator (e.g. StringNotEquals aws:PrincipalOrgID) only
+    # excludes principals, and an ...IfExists operator passes requests that
+    # lack the key, so neither narrows who is granted access
+    return 'Not' not in operator and operator != 'Null' and not operator.endswith('IfExists')
+
+def condition_scope(key, values):
+    """Return (org IDs, account IDs) a condition pins principals to; both empty if it pins nothing."""
+    if key in ORG_CONDITION_KEYS:
+        return {v for v in values if ORG_ID_RE.match(v)}, set()
+    if key in ORG_PATH_CONDITION_KEYS:
+        return {v.split('/')[0] for v in values if ORG_ID_RE.match(v.split('/')[0])}, set()
+    if key in ACCOUNT_CONDITION_KEYS:
+        return set(), {v for v in values if ACCOUNT_ID_RE.match(v)}
+    if key in ARN_CONDITION_KEYS:
+        return set(), {a for a in (principal_account(v) for v in values) if a}
+    return set(), set()
+
+def analyze_statement(index, statement, account_id, org_id):
+    """Classify one normalized statement, or return None if it grants nothing outside the account."""
+    if statement.effect != 'Allow':
+        return None
+
+    external_accounts = set()
+    org_ids = set()
+    # NotPrincipal grants to everyone except the listed principals, so none of
+    # them are grantees
+    wildcard = statement.negated
+    via_service = False
+    for principal_type, value in () if statement.negated else statement.principals:
+        if value == '*':
+            wildcard = True
+            continue
+        if principal_type == 'Service':
+            via_service = True
+        if principal_type != 'AWS':
+            continue
+        account = principal_account(value)
+        if account and account != account_id:
+            external_accounts.add(account)
+        org = principal_org_id(value)
+        if org:
+            org_ids.add(org)
+
+    # Wildcard and service principals are narrowed to other accounts by conditions
+    conditional = wildcard or via_service
+    scoped = False
+    for operator, key, values in statement.conditions:
+        if not _scoping(operator):
+            continue
+        orgs, accounts = condition_scope(key, values)
+        if not (orgs or accounts):
+            continue
+        scoped = True
+        org_ids.update(orgs)
+        if conditional:
+            external_accounts.update(a for a in accounts if a != account_id)
+
+    public = wildcard and not scoped
+    cross_org = bool(org_id) and any(o != org_id for o in org_ids)
+    if not (external_accounts or public or org_ids):
+        return None
+    return StatementAnalysis(
+        index=index,
+        sid=statement.sid,
+        external_accounts=tuple(sorted(external_accounts)),
+        public=public,
+        org_ids=tuple(sorted(org_ids)),
+        cross_org=cross_org
+    )
+
+def _matches_any(target, patterns):
+    return any(fnmatchcase(target, pattern.lower()) for pattern in patterns)
+
+def allows_assume_role(statement):
+    # NotAction allows every action its patterns do not match
+    if statement.not_action:
+        return any(not _matches_any(target, statement.actions) for target in ASSUME_ROLE_ACTIONS)
+    return any(_matches_any(target, statement.actions) for target in ASSUME_ROLE_ACTIONS)
+
+def analyze_identity_statement(index, statement, account_id):
+    """Classify one statement of an identity (user, group or role) policy.
+
+    Returns None unless it allows actions on resources in other accounts,
+    judged by the account field of its Resource ARNs, or allows assuming roles
+    outside the account. NotAction and NotResource are matched by complement:
+    a NotResource statement covers resources in every account.
+    """
+    if statement.effect != 'Allow':
+        return None
+    external_accounts = set()
+    wildcard = statement.not_resource
+    for resource in () if statement.not_resource else statement.resources:
+        if resource == '*':
+            wildcard = True
+            continue
+        arn = parse_arn(resource)
+        if not arn:
+            continue
+        if arn.account == '*':
+            wildcard = True
+        elif ACCOUNT_ID_RE.match(arn.account) and arn.account != account_id:
+            external_accounts.add(arn.account)
+    assume_role = allows_assume_role(statement) and (wildcard or bool(external_accounts))
+    if not (external_accounts or assume_role):
+        return None
+    return ResourceAccess(
+        index=index,
+        sid=statement.sid,
+        external_accounts=tuple(sorted(external_accounts)),
+        assume_role=assume_role,
+        any_account=assume_role and wildcard
+    )
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+def policy_digest(policy):
+    """SHA-256 of a policy: of the raw text for a JSON string, else of its canonical JSON form."""
+    if not isinstance(policy, str):
+        policy = json.dumps(policy, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(policy.encode()).hexdigest()
+
+def _memoized(key, policy, analyze):
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    document = json.loads(policy) if isinstance(policy, str) else policy
+    result = tuple(
+        analysis
+        for analysis in (
+            analyze(index, statement)
+            for index, statement in enumerate(normalize_policy(document))
+        )
+        if analysis
+    )
+
+    with _cache_lock:
+        _cache[key] = result
+        if len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return result
+
+def analyze_policy(policy, account_id, org_id=None):
+    """Return a StatementAnalysis for every statement granting access outside `account_id`.
+
+    `policy` may be a JSON string or a parsed document. Results are memoized by
+    the document's hash (of the raw text when a string is given, so a cache
+    hit skips JSON parsing), and a policy repeated across many resources is
+    only classified once per (account, organization).
+    """
+    return _memoized(
+        ('resource', policy_digest(policy), account_id, org_id),
+        policy,
+        lambda index, statement: analyze_statement(index, statement, account_id, org_id)
+    )
+
+def analyze_identity_policy(policy, account_id):
+    """Return a ResourceAccess for every identity policy statement reaching outside `account_id`.
+
+    Memoized the same way as analyze_policy.
+    """
+    return _memoized(
+        ('identity', policy_digest(policy), account_id),
+        policy,
+        lambda index, statement: analyze_identity_statement(index, statement, account_id)
+    )
+
+def access_principals(analysis):
+    """Who a statement grants access to: '*' if public, then account IDs, then organization IDs."""
+    return (('*',) if analysis.public else ()) + analysis.external_accounts + analysis.org_ids
+
+def describe_access(analysis):
+    """Short human-readable summary of who a statement grants access to."""
+    return ', '.join(access_principals(analysis))
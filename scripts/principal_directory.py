@@ -0,0 +1,57 @@
+from functools import lru_cache
+
+from botocore.exceptions import ClientError
+
+class PrincipalDirectory:
+    """Resolve Identity Center user and group IDs to names for one identity store.
+
+    All users and groups are paged into memory once by `load()`. IDs that are
+    not in the prefetched maps (created mid-scan, or listing was denied) fall
+    back to describe_user/describe_group through a bounded LRU cache.
+    """
+
+    def __init__(self, identitystore, identity_store_id, cache_size=1024):
+        self.identitystore = identitystore
+        self.identity_store_id = identity_store_id
+        self.users = {}
+        self.groups = {}
+        self._describe = lru_cache(maxsize=cache_size)(self._describe_principal)
+
+    def load(self):
+        try:
+            paginator = self.identitystore.get_paginator('list_users')
+            for page in paginator.paginate(IdentityStoreId=self.identity_store_id):
+                for user in page['Users']:
+                    self.users[user['UserId']] = user['UserName']
+            paginator = self.identitystore.get_paginator('list_groups')
+            for page in paginator.paginate(IdentityStoreId=self.identity_store_id):
+                for group in page['Groups']:
+                    self.groups[group['GroupId']] = group.get('DisplayName', 'Unknown')
+        except ClientError as e:
+            print(f"Could not prefetch identity store {self.identity_store_id}, falling back to lookups: {e}")
+        return self
+
+    def resolve(self, principal_type, principal_id):
+        if principal_type == 'USER' and principal_id in self.users:
+            return self.users[principal_id]
+        if principal_type == 'GROUP' and principal_id in self.groups:
+            return self.groups[principal_id]
+        return self._describe(principal_type, principal_id)
+
+    def _describe_principal(self, principal_type, principal_id):
+        try:
+            if principal_type == 'USER':
+                user = self.identitystore.describe_user(
+                    IdentityStoreId=self.identity_store_id,
+                    UserId=principal_id
+                )
+                return user['UserName']
+            if principal_type == 'GROUP':
+                group = self.identitystore.describe_group(
+                    IdentityStoreId=self.identity_store_id,
+                    GroupId=principal_id
+                )
+                return group['DisplayName']
+        except Exception:
+            pass
+        return 'Unknown'
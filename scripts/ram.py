@@ -1,35 +1,230 @@
-import boto3
+import argparse
+import re
+from collections import defaultdict, namedtuple
 
-def get_active_regions():
-    ec2 = boto3.client('ec2')
-    response = ec2.describe_regions(AllRegions=False)
-    regions = [region['RegionName'] for region in response['Regions']]
-    return regions
+from botocore.exceptions import ClientError
+
+from clients import get_client
+from fanout import run_in_regions
+from regions import get_enabled_regions
+
+Share = namedtuple('Share', ['arn', 'name', 'region', 'status', 'allow_external'])
+ShareResource = namedtuple('ShareResource', ['arn', 'type', 'region_scope'])
+SharePrincipal = namedtuple('SharePrincipal', ['id', 'external'])
+
+ACCOUNT_ID = re.compile(r'^\d{12}$')
+# arn:aws:organizations::123456789012:organization/o-abc or .../ou/o-abc/ou-abc-12345678
+ORG_PRINCIPAL = re.compile(r'^arn:[^:]+:organizations::\d{12}:(?P<kind>organization|ou)/(?:.*/)?(?P<id>[^/]+)$')
+
+def list_ram_resources_in_region(region):
+    ram = get_client('ram', region)
+    resources = []
+    next_token = None
+
+    while True:
+        params = {'resourceOwner': 'SELF'}
+        if next_token:
+            params['nextToken'] = next_token
+
+        response = ram.list_resources(**params)
+        resources.extend(response.get('resources', []))
+        next_token = response.get('nextToken')
+        if not next_token:
+            break
+
+    return resources
 
 def list_ram_resources_in_active_regions():
-    session = boto3.Session()
-    active_regions = get_active_regions()
+    active_regions = get_enabled_regions('ram')
     all_resources = []
 
-    for region in active_regions:
-        print(f"Scanning region: {region}")
-        ram = session.client('ram', region_name=region)
-        next_token = None
+    for region_result in run_in_regions(active_regions, list_ram_resources_in_region):
+        print(f"Scanning region: {region_result.region}")
+        if region_result.error is not None:
+            print(f"  Error scanning region {region_result.region}: {region_result.error}")
+            continue
+        all_resources.extend(region_result.result)
 
-        while True:
-            params = {'resourceOwner': 'SELF'}
-            if next_token:
-                params['nextToken'] = next_token
+    return all_resources
 
-            response = ram.list_resources(**params)
-            all_resources.extend(response.get('resources', []))
-            next_token = response.get('nextToken')
-            if not next_token:
-                break
+def paginate(ram, operation, key, **params):
+    items = []
+    for page in ram.get_paginator(operation).paginate(**params):
+        items.extend(page.get(key, []))
+    return items
 
-    return all_resources
+def collect_share_graph_region(region):
+    """Page every active share we own in the region, with its resources and principals, in three bulk listings.
+
+    list_resources and list_principals return one entry per (item, share)
+    across all shares, so no per-share calls are needed; entries of shares
+    that are not active are dropped when the graph is built.
+    """
+    ram = get_client('ram', region)
+    shares = paginate(ram, 'get_resource_shares', 'resourceShares', resourceOwner='SELF', resourceShareStatus='ACTIVE')
+    resources = paginate(ram, 'list_resources', 'resources', resourceOwner='SELF')
+    principals = paginate(ram, 'list_principals', 'principals', resourceOwner='SELF')
+    return shares, resources, principals
+
+def principal_account(principal_id):
+    """Return the account ID behind an account or IAM principal, or None for organizations and OUs."""
+    if ACCOUNT_ID.match(principal_id):
+        return principal_id
+    parts = principal_id.split(':')
+    if len(parts) > 4 and parts[2] == 'iam' and ACCOUNT_ID.match(parts[4]):
+        return parts[4]
+    return None
+
+def org_principal(principal_id):
+    """Return ('organization', org ID) or ('ou', OU ID) for an Organizations principal, else None."""
+    match = ORG_PRINCIPAL.match(principal_id)
+    return (match.group('kind'), match.group('id')) if match else None
+
+def account_ous(org, account_id):
+    """Return the IDs of the OUs containing `account_id`, from its parent up to the root."""
+    ous = []
+    child = account_id
+    while True:
+        parents = org.list_parents(ChildId=child)['Parents']
+        if not parents or parents[0]['Type'] == 'ROOT':
+            return ous
+        child = parents[0]['Id']
+        ous.append(child)
+
+class ShareGraph:
+    """Resource shares joined with their resources and principals, indexed both ways.
+
+    Built once from the regional listings, so questions about any number of
+    accounts are answered from memory.
+    """
+
+    def __init__(self):
+        self.shares = {}
+        self.resources = defaultdict(list)
+        self.principals = defaultdict(list)
+        self.shares_by_account = defaultdict(set)
+        self.shares_by_org_principal = defaultdict(set)
+
+    def add_region(self, region, shares, resources, principals):
+        for share in shares:
+            if share.get('status', 'ACTIVE') != 'ACTIVE':
+                continue
+            self.shares[share['resourceShareArn']] = Share(
+                share['resourceShareArn'], share.get('name'), region, share.get('status'),
+                share.get('allowExternalPrincipals', False)
+            )
+        for resource in resources:
+            self.resources[resource['resourceShareArn']].append(
+                ShareResource(resource['arn'], resource.get('type'), resource.get('resourceRegionScope'))
+            )
+        for principal in principals:
+            share_arn = principal['resourceShareArn']
+            self.principals[share_arn].append(SharePrincipal(principal['id'], principal.get('external', False)))
+            account_id = principal_account(principal['id'])
+            org = org_principal(principal['id'])
+            # Service principals are not affected by accounts leaving
+            if account_id:
+                self.shares_by_account[account_id].add(share_arn)
+            elif org:
+                self.shares_by_org_principal[org].add(share_arn)
+        return self
+
+    def departure_impact(self, account_id, ous=None):
+        """Return ([(share, reason)], [(share, reason)]) for the shares affected if `account_id` leaves.
+
+        The first list holds confirmed impact: direct shares to the account,
+        which break unless the share allows external principals, shares to the
+        organization, and shares to the OUs in `ous` (the account's OU IDs).
+        When `ous` is None the account's OUs are unknown, and every share to an
+        OU goes in the second list as unresolved.
+        """
+        impact = []
+        unresolved = []
+        for share_arn in sorted(self.shares_by_account.get(account_id, ())):
+            share = self.shares.get(share_arn)
+            if share is None:
+                continue
+            if share.allow_external:
+                impact.append((share, "shared directly; continues as an external share"))
+            else:
+                impact.append((share, "shared directly; breaks, external principals are not allowed"))
+        for (kind, principal_id), share_arns in sorted(self.shares_by_org_principal.items()):
+            if kind == 'ou' and ous is not None and principal_id not in ous:
+                continue
+            for share_arn in sorted(share_arns):
+                share = self.shares.get(share_arn)
+                if share is None:
+                    continue
+                if kind == 'ou' and ous is None:
+                    unresolved.append((share, f"shared with {principal_id}; OU membership not resolved"))
+                else:
+                    impact.append((share, f"loses access received through {principal_id}"))
+        return impact, unresolved
+
+def collect_share_graph():
+    graph = ShareGraph()
+    for region_result in run_in_regions(get_enabled_regions('ram'), collect_share_graph_region):
+        if region_result.error is not None:
+            print(f"  Error scanning region {region_result.region}: {region_result.error}")
+            continue
+        graph.add_region(region_result.region, *region_result.result)
+    return graph
+
+def print_share_graph(graph):
+    for share_arn, share in sorted(graph.shares.items(), key=lambda item: (item[1].region, item[1].name or '')):
+        external = 'allows external principals' if share.allow_external else 'organization only'
+        print(f"\nShare: {share.name} ({share.region}, {share.status}, {external})")
+        print(f"  ARN: {share_arn}")
+        for resource in graph.resources.get(share_arn, []):
+            print(f"  Resource: {resource.arn}, Type: {resource.type}")
+        for principal in graph.principals.get(share_arn, []):
+            print(f"  Principal: {principal.id}{' (external)' if principal.external else ''}")
+
+def print_shares(graph, shares):
+    for share, reason in shares:
+        resources = graph.resources.get(share.arn, [])
+        print(f"  {share.name} ({share.region}): {reason}, {len(resources)} resource(s)")
+        for resource in resources:
+            print(f"    - {resource.arn}")
+
+def print_departure_impact(graph, account_id, ous):
+    print(f"\nIf {account_id} leaves the organization:")
+    impact, unresolved = graph.departure_impact(account_id, ous)
+    if not (impact or unresolved):
+        print("  No resource shares are affected.")
+    print_shares(graph, impact)
+    if unresolved:
+        print("  Shares to OUs that may contain the account:")
+        print_shares(graph, unresolved)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="List AWS RAM resources we own and who they are shared with.")
+    parser.add_argument('--mode', choices=['resources', 'graph'], default='resources',
+                        help="'resources' lists the resources we share; 'graph' also pages shares and "
+                             "principals and joins them into a share -> resources -> principals graph")
+    parser.add_argument('--departing-account', action='append', default=[], metavar='ACCOUNT_ID',
+                        help="With --mode graph, report the shares affected if this account leaves the "
+                             "organization, resolving its OUs through Organizations (repeatable)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.mode == 'graph':
+        graph = collect_share_graph()
+        print_share_graph(graph)
+        org = get_client('organizations') if args.departing_account else None
+        for account_id in args.departing_account:
+            try:
+                ous = set(account_ous(org, account_id))
+            except ClientError as e:
+                print(f"\nCould not resolve the OUs of {account_id}: {e}")
+                ous = None
+            print_departure_impact(graph, account_id, ous)
+        return
 
-if __name__ == "__main__":
     ram_resources = list_ram_resources_in_active_regions()
     for resource in ram_resources:
-        print(f"Resource ARN: {resource['arn']}, Type: {resource['type']}, Region: {resource.get('regionScope')}")
\ No newline at end of file
+        print(f"Resource ARN: {resource['arn']}, Type: {resource['type']}, Region: {resource.get('regionScope')}")
+
+if __name__ == "__main__":
+    main()
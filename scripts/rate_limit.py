@@ -0,0 +1,178 @@
+import sys
+import threading
+import time
+
+from clients import THROTTLE_CODES, add_client_hook, session_account
+
+# Starting requests per second by service, set a little under the published
+# quotas of the operations the scanners call most (describe_image_attribute,
+# get_key_policy, lambda get_policy, list_account_assignments, get_object_acl)
+DEFAULT_RATES = {
+    'ec2': 20.0,
+    'kms': 50.0,
+    'lambda': 10.0,
+    'sso-admin': 15.0,
+    'identitystore': 15.0,
+    's3': 200.0,
+    'iam': 10.0,
+    'organizations': 5.0,
+}
+DEFAULT_RATE = 20.0
+# A bucket may recover to at most this multiple of its starting rate
+MAX_RATE_FACTOR = 4.0
+MIN_RATE = 0.5
+# On throttling the rate is multiplied by BACKOFF, at most once per COOLDOWN
+# seconds so a burst of throttled in-flight calls counts as one signal
+BACKOFF = 0.5
+COOLDOWN = 1.0
+# After RECOVERY_INTERVAL seconds without throttling, each successful call
+# raises the rate by RECOVERY_STEP of the starting rate
+RECOVERY_INTERVAL = 5.0
+RECOVERY_STEP = 0.1
+
+class TokenBucket:
+    """Token bucket whose rate backs off on throttling and recovers additively."""
+
+    def __init__(self, rate):
+        self.start_rate = rate
+        self.rate = rate
+        self.max_rate = rate * MAX_RATE_FACTOR
+        self.tokens = max(1.0, rate)
+        self.throttles = 0
+        self.waited = 0.0
+        self._updated = time.monotonic()
+        self._last_change = self._updated
+        self._last_backoff = float('-inf')
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(max(1.0, self.rate), self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+                self.waited += wait
+            time.sleep(wait)
+
+    def throttled(self):
+        with self._lock:
+            self.throttles += 1
+            now = time.monotonic()
+            if now - self._last_backoff < COOLDOWN:
+                return
+            self._refill(now)
+            self.rate = max(MIN_RATE, self.rate * BACKOFF)
+            self.tokens = min(self.tokens, 0.0)
+            self._last_backoff = self._last_change = now
+
+    def succeeded(self):
+        with self._lock:
+            now = time.monotonic()
+            if self.rate >= self.max_rate or now - self._last_change < RECOVERY_INTERVAL:
+                return
+            self._refill(now)
+            self.rate = min(self.max_rate, self.rate + self.start_rate * RECOVERY_STEP)
+            self._last_change = now
+
+class RateLimiter:
+    """Client-side rate limits per (account, region, service), shared by every client and thread.
+
+    Each HTTP attempt, retries included, takes a token before it is sent
+    (before-send). needs-retry sees every response: a throttling error halves
+    the bucket's rate, and successes raise it back over time, so concurrent
+    scans settle just under the API quota rather than leaning on retries.
+    """
+
+    def __init__(self, rates=None, default_rate=DEFAULT_RATE):
+        self.rates = dict(DEFAULT_RATES)
+        self.rates.update(rates or {})
+        self.default_rate = default_rate
+        self.buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, account, region, service):
+        key = (account, region, service)
+        with self._lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = self.buckets[key] = TokenBucket(self.rates.get(service, self.default_rate))
+            return bucket
+
+    def install(self, client, session=None):
+        service = client.meta.service_model.service_name
+        region = client.meta.region_name or 'global'
+        buckets = []
+
+        def get_bucket():
+            # The account is resolved on first use; CredentialCache records it
+            # after the session, and so its clients, may already exist
+            if not buckets:
+                buckets.append(self.bucket(session_account(session) or 'current', region, service))
+            return buckets[0]
+
+        def before_send(**kwargs):
+            get_bucket().acquire()
+            return None
+
+        def needs_retry(response, **kwargs):
+            if response is not None:
+                if response[1].get('Error', {}).get('Code') in THROTTLE_CODES:
+                    get_bucket().throttled()
+                else:
+                    get_bucket().succeeded()
+            return None
+
+        client.meta.events.register('before-send', before_send)
+        client.meta.events.register_first('needs-retry', needs_retry)
+
+    def current_rates(self):
+        """Return [(account, region, service, rate, starting rate, throttles, seconds waited)]."""
+        with self._lock:
+            items = sorted(self.buckets.items())
+        return [
+            key + (bucket.rate, bucket.start_rate, bucket.throttles, bucket.waited)
+            for key, bucket in items
+        ]
+
+    def summary_table(self):
+        lines = [
+            f"{'Account':<14} {'Region':<15} {'Service':<16} {'Rate/s':>8} {'Start/s':>8} {'Throttles':>9} {'Waited s':>9}"
+        ]
+        for account, region, service, rate, start_rate, throttles, waited in self.current_rates():
+            lines.append(
+                f"{account:<14} {region:<15} {service:<16} {rate:>8.1f} {start_rate:>8.1f} {throttles:>9} {waited:>9.1f}"
+            )
+        return '\n'.join(lines)
+
+def parse_rates(values):
+    """Parse ['kms=100', 'ec2=10'] into {'kms': 100.0, 'ec2': 10.0}."""
+    rates = {}
+    for value in values or []:
+        service, _, rate = value.partition('=')
+        if not rate:
+            raise ValueError(f"Expected SERVICE=RATE, got {value!r}")
+        rates[service] = float(rate)
+    return rates
+
+_limiter = None
+
+def enable(rates=None, default_rate=DEFAULT_RATE):
+    """Rate limit every client created from now on."""
+    global _limiter
+    if _limiter is None:
+        _limiter = RateLimiter(rates, default_rate)
+        add_client_hook(_limiter.install)
+    return _limiter
+
+def report():
+    if _limiter is None:
+        return
+    print("\n=== CLIENT RATE LIMITS ===", file=sys.stderr)
+    print(_limiter.summary_table(), file=sys.stderr)
@@ -1,65 +1,28 @@
-import boto3
-from datetime import datetime, timedelta
-
-# Initialize Cost Explorer client
-client = boto3.client('ce')
-
-# Define the time period (last full month)
-end = datetime.today().replace(day=1)
-start = (end - timedelta(days=1)).replace(day=1)
-
-# Step 1: Find top 5 regions by cost
-response = client.get_cost_and_usage(
-    TimePeriod={
-        'Start': start.strftime('%Y-%m-%d'),
-        'End': end.strftime('%Y-%m-%d')
-    },
-    Granularity='MONTHLY',
-    Metrics=['UnblendedCost'],
-    GroupBy=[
-        {'Type': 'DIMENSION', 'Key': 'REGION'}
-    ]
-)
-
-region_costs = []
-for group in response['ResultsByTime'][0]['Groups']:
-    region = group['Keys'][0]
-    cost = float(group['Metrics']['UnblendedCost']['Amount'])
-    region_costs.append((region, cost))
-
-top_regions = sorted(region_costs, key=lambda x: x[1], reverse=True)[:5]
-
-print("Top 5 Most Active AWS Regions (by cost):")
-for rank, (region, cost) in enumerate(top_regions, 1):
-    print(f"{rank}. {region}: ${cost:.2f}")
-
-# Step 2: For each top region, find top services
-print("\nTop Services by Cost in Each Region:")
-for region, _ in top_regions:
-    service_response = client.get_cost_and_usage(
-        TimePeriod={
-            'Start': start.strftime('%Y-%m-%d'),
-            'End': end.strftime('%Y-%m-%d')
-        },
-        Granularity='MONTHLY',
-        Metrics=['UnblendedCost'],
-        Filter={
-            'Dimensions': {
-                'Key': 'REGION',
-                'Values': [region]
-            }
-        },
-        GroupBy=[
-            {'Type': 'DIMENSION', 'Key': 'SERVICE'}
-        ]
-    )
-    service_costs = []
-    for group in service_response['ResultsByTime'][0]['Groups']:
-        service = group['Keys'][0]
-        cost = float(group['Metrics']['UnblendedCost']['Amount'])
-        service_costs.append((service, cost))
-    top_services = sorted(service_costs, key=lambda x: x[1], reverse=True)[:5]
-
-    print(f"\nRegion: {region}")
-    for idx, (service, cost) in enumerate(top_services, 1):
-        print(f"  {idx}. {service}: ${cost:.2f}")
\ No newline at end of file
+import argparse
+
+from cost_usage import DEFAULT_METRIC, region_service_costs, top_regions, top_services
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Rank regions and services by cost for the last full month.")
+    parser.add_argument('--top', type=int, default=5, help="Number of regions and services to show (default: 5)")
+    parser.add_argument('--metric', default=DEFAULT_METRIC, help=f"Cost Explorer metric (default: {DEFAULT_METRIC})")
+    parser.add_argument('--no-cache', action='store_true', help="Always query Cost Explorer, even for a closed month")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    costs = region_service_costs(metric=args.metric, use_cache=not args.no_cache)
+    regions = top_regions(costs, args.top)
+
+    print(f"Top {args.top} Most Active AWS Regions (by cost):")
+    for rank, (region, cost) in enumerate(regions, 1):
+        print(f"{rank}. {region}: ${cost:.2f}")
+
+    print("\nTop Services by Cost in Each Region:")
+    for region, _ in regions:
+        print(f"\nRegion: {region}")
+        for idx, (service, cost) in enumerate(top_services(costs, region, args.top), 1):
+            print(f"  {idx}. {service}: ${cost:.2f}")
+
+if __name__ == "__main__":
+    main()
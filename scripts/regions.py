@@ -0,0 +1,75 @@
+import os
+import threading
+
+from clients import current_session, get_client, get_session, session_account
+from local_cache import load_json, save_json
+
+# Enabled regions change only when someone opts a region in or out
+REGION_CACHE_TTL = int(os.environ.get('SCAN_REGION_CACHE_TTL', str(24 * 3600)))
+ENABLED_STATUSES = ('opt-in-not-required', 'opted-in')
+
+_lock = threading.Lock()
+_enabled = {}
+_service_regions = {}
+
+def _current_account():
+    session = current_session.get() or get_session()
+    account_id = session_account(session)
+    if account_id is None:
+        account_id = get_client('sts').get_caller_identity()['Account']
+    return account_id
+
+def describe_enabled_regions(account_id=None):
+    """Return the regions enabled in the account, from memory, the disk cache or describe_regions.
+
+    Results are cached per account for REGION_CACHE_TTL seconds, so repeated
+    runs and every scanner in a run share a single describe_regions call.
+    """
+    account_id = account_id or _current_account()
+    with _lock:
+        if account_id in _enabled:
+            return list(_enabled[account_id])
+    cache_name = f"regions/{account_id}.json"
+    regions = load_json(cache_name, max_age=REGION_CACHE_TTL)
+    if regions is None:
+        response = get_client('ec2').describe_regions(AllRegions=False)
+        regions = sorted(
+            r['RegionName'] for r in response['Regions'] if r.get('OptInStatus', ENABLED_STATUSES[0]) in ENABLED_STATUSES
+        )
+        save_json(cache_name, regions)
+    with _lock:
+        _enabled[account_id] = regions
+    return list(regions)
+
+def service_regions(service, partitions=('aws',)):
+    """Return the regions where botocore's bundled endpoint metadata says `service` is offered.
+
+    Returns None when the metadata does not list the service at all (e.g.
+    services newer than the installed botocore), meaning "don't prune".
+    """
+    key = (service, tuple(partitions))
+    with _lock:
+        if key in _service_regions:
+            return _service_regions[key]
+    session = get_session()
+    offered = set()
+    for partition in partitions:
+        offered.update(session.get_available_regions(service, partition_name=partition))
+    result = offered or None
+    with _lock:
+        _service_regions[key] = result
+    return result
+
+def partitions_for(regions):
+    session = get_session()._session
+    return tuple(sorted({session.get_partition_for_region(region) for region in regions}))
+
+def get_enabled_regions(service=None, account_id=None):
+    """Return the enabled regions of the current account, limited to those offering `service` if given."""
+    regions = describe_enabled_regions(account_id)
+    if service is None or not regions:
+        return regions
+    offered = service_regions(service, partitions_for(regions))
+    if offered is None:
+        return regions
+    return [region for region in regions if region in offered]
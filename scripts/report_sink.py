@@ -0,0 +1,112 @@
+import csv
+import json
+import os
+
+FORMATS = ('csv', 'jsonl', 'parquet')
+
+class CsvSink:
+    """Write report rows to CSV as they are produced.
+
+    The file is opened on the first row, so an empty report creates no file,
+    and it is line buffered so rows already written survive a crash.
+    """
+
+    def __init__(self, path, fieldnames):
+        self.path = path
+        self.fieldnames = fieldnames
+        self.count = 0
+        self._file = None
+        self._writer = None
+
+    def _open(self):
+        self._file = open(self.path, 'w', newline='', buffering=1)
+        self._writer = csv.DictWriter(self._file, fieldnames=self.fieldnames)
+        self._writer.writeheader()
+
+    def write(self, row):
+        if self._file is None:
+            self._open()
+        self._writer.writerow(row)
+        self.count += 1
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class JsonlSink(CsvSink):
+    """Write report rows as one JSON object per line."""
+
+    def _open(self):
+        self._file = open(self.path, 'w', buffering=1)
+
+    def write(self, row):
+        if self._file is None:
+            self._open()
+        self._file.write(json.dumps({k: row.get(k) for k in self.fieldnames}, default=str) + '\n')
+        self.count += 1
+
+class ParquetSink(CsvSink):
+    """Write report rows to Parquet in row groups of `batch_size` rows.
+
+    Requires pyarrow. Only completed row groups are durable, and the file is
+    not readable until close() writes the footer.
+    """
+
+    def __init__(self, path, fieldnames, batch_size=10000):
+        super().__init__(path, fieldnames)
+        self.batch_size = batch_size
+        self._batch = []
+
+    def _open(self):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("Parquet output requires pyarrow: pip install pyarrow")
+        self._pa = pa
+        self._schema = pa.schema([(name, pa.string()) for name in self.fieldnames])
+        self._writer = pq.ParquetWriter(self.path, self._schema)
+        self._file = self._writer
+
+    def write(self, row):
+        if self._file is None:
+            self._open()
+        self._batch.append(row)
+        self.count += 1
+        if len(self._batch) >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        if not self._batch:
+            return
+        columns = {
+            name: [None if row.get(name) is None else str(row.get(name)) for row in self._batch]
+            for name in self.fieldnames
+        }
+        self._writer.write_table(self._pa.Table.from_pydict(columns, schema=self._schema))
+        self._batch = []
+
+    def close(self):
+        if self._file is not None:
+            self._flush()
+            self._writer.close()
+            self._file = None
+
+def open_sink(path, fieldnames, fmt=None):
+    """Return a sink for `path`, picking the format from its extension if not given."""
+    if fmt is None:
+        fmt = os.path.splitext(path)[1][1:].lower() or 'csv'
+    if fmt == 'csv':
+        return CsvSink(path, fieldnames)
+    if fmt == 'jsonl':
+        return JsonlSink(path, fieldnames)
+    if fmt == 'parquet':
+        return ParquetSink(path, fieldnames)
+    raise ValueError(f"Unsupported report format: {fmt} (expected one of {', '.join(FORMATS)})")
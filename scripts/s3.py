@@ -1,29 +1,24 @@
-import boto3
+import argparse
 import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from botocore.exceptions import ClientError
 
-def is_cross_account_or_org_policy(statement, current_account):
-    if 'Principal' in statement:
-        principal = statement['Principal']
-        if isinstance(principal, dict):
-            aws_principal = principal.get('AWS')
-            if isinstance(aws_principal, list):
-                for arn in aws_principal:
-                    if f":{current_account}:" not in arn:
-                        return True
-            elif isinstance(aws_principal, str):
-                if f":{current_account}:" not in aws_principal:
-                    return True
-        elif principal == "*":
-            return False
-    if 'Condition' in statement:
-        condition = statement['Condition']
-        for cond in condition.values():
-            if isinstance(cond, dict):
-                for key in cond:
-                    if key == "aws:PrincipalOrgID":
-                        return True
-    return False
+import async_engine
+from clients import get_client, set_max_pool_connections
+from fanout import bind_context, run_in_regions
+from local_cache import load_json, update_json
+from findings import Finding, emit, from_rows, to_rows
+from policy_analysis import access_principals, analyze_policy, policy_statements
+import snapshot_store
+
+SAMPLE_SIZE = 1000
+MAX_SPLIT_DEPTH = 3
+PROGRESS_INTERVAL = 30
+BUCKET_REGION_CACHE = 's3-bucket-regions.json'
+S3_CHANGE_EVENTS = ['PutBucketPolicy', 'DeleteBucketPolicy', 'PutBucketAcl', 'CreateBucket']
 
 def is_cross_account_acl(grants, current_owner_id):
     findings = []
@@ -51,75 +46,319 @@ def get_bucket_region(s3_client, bucket_name):
         print(f"  Error getting region for bucket {bucket_name}: {e}")
         return None
 
-def main():
-    s3 = boto3.client('s3')
-    sts = boto3.client('sts')
-    current_account = sts.get_caller_identity()['Account']
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Scan S3 buckets for cross-account and organization permissions.")
+    parser.add_argument(
+        '--object-scan',
+        choices=['sample', 'full', 'none'],
+        default='sample',
+        help=f"'sample' checks the first {SAMPLE_SIZE} objects per bucket, 'full' checks every object (default: sample)"
+    )
+    snapshot_store.add_arguments(parser)
+    parser.add_argument('--bucket-workers', type=int, default=4, help="Buckets scanned concurrently (default: 4)")
+    parser.add_argument('--list-workers', type=int, default=8, help="Concurrent list_objects_v2 workers per bucket (default: 8)")
+    parser.add_argument('--acl-workers', type=int, default=32, help="Concurrent get_object_acl workers per bucket (default: 32)")
+    return parser.parse_args(argv)
 
-    buckets = s3.list_buckets()['Buckets']
-    total_buckets = len(buckets)
-    findings_found = False
+def is_bucket_owner_enforced(s3_client, bucket_name):
+    try:
+        controls = s3_client.get_bucket_ownership_controls(Bucket=bucket_name)
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'OwnershipControlsNotFoundError':
+            return False
+        raise
+    rules = controls['OwnershipControls'].get('Rules', [])
+    return any(rule.get('ObjectOwnership') == 'BucketOwnerEnforced' for rule in rules)
 
-    print("Scanning S3 buckets for cross-account and organization permissions...\n")
+def split_keyspace(s3_client, bucket_name, min_parts, on_keys):
+    """Split a bucket's keyspace into prefixes that can be listed independently.
+
+    Prefixes are expanded one delimiter level at a time (up to MAX_SPLIT_DEPTH)
+    until there are at least `min_parts` of them. Keys found directly at an
+    expanded level are passed to `on_keys` as they are listed, since no
+    remaining prefix covers them.
+    """
+    paginator = s3_client.get_paginator('list_objects_v2')
+    prefixes = ['']
+    for _ in range(MAX_SPLIT_DEPTH):
+        if len(prefixes) >= min_parts:
+            break
+        expanded = []
+        for prefix in prefixes:
+            for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix, Delimiter='/'):
+                on_keys(page.get('Contents', []))
+                expanded.extend(p['Prefix'] for p in page.get('CommonPrefixes', []))
+        prefixes = expanded
+        if not prefixes:
+            break
+    return prefixes
+
+class ScanProgress:
+    """Thread-safe counters for an object ACL scan, reported periodically to stderr."""
+
+    def __init__(self, bucket_name, interval=PROGRESS_INTERVAL):
+        self.bucket_name = bucket_name
+        self.interval = interval
+        self.listed = 0
+        self.checked = 0
+        self.errors = 0
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._report_loop, daemon=True)
+
+    def add(self, listed=0, checked=0, errors=0):
+        with self._lock:
+            self.listed += listed
+            self.checked += checked
+            self.errors += errors
+
+    def line(self):
+        elapsed = time.monotonic() - self.started
+        rate = self.checked / elapsed if elapsed else 0.0
+        return (f"  {self.bucket_name}: {self.listed} objects listed, {self.checked} ACLs checked, "
+                f"{self.errors} errors in {elapsed:.1f}s ({rate:.0f} ACLs/s)")
+
+    def _report_loop(self):
+        while not self._stop.wait(self.interval):
+            print(self.line(), file=sys.stderr)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        print(self.line(), file=sys.stderr)
+
+def check_object_acl(s3_client, bucket_name, key):
+    obj_acl = s3_client.get_object_acl(Bucket=bucket_name, Key=key)
+    return is_cross_account_acl(obj_acl['Grants'], obj_acl['Owner']['ID'])
+
+def scan_object_acls(s3_client, bucket_name, full=False, list_workers=8, acl_workers=32):
+    """Check object ACLs in a bucket and return (key, grantees) for flagged objects, sorted by key.
+
+    In sample mode only the first SAMPLE_SIZE keys are checked. In full mode the
+    keyspace is split across `list_workers` concurrent listings. Either way,
+    ACL fetches go through a pool of `acl_workers` threads fed through a bounded
+    number of in-flight requests, so memory does not grow with bucket size.
+    With the async engine enabled, each listed page's ACLs are fetched as one
+    batch of coroutines instead.
+    """
+    paginator = s3_client.get_paginator('list_objects_v2')
+    in_flight = threading.BoundedSemaphore(acl_workers * 4)
+    results = []
+    results_lock = threading.Lock()
+
+    with ScanProgress(bucket_name) as progress, ThreadPoolExecutor(max_workers=acl_workers) as acl_pool:
+        def on_done(future, key):
+            in_flight.release()
+            try:
+                obj_findings = future.result()
+            except Exception:
+                progress.add(checked=1, errors=1)
+                return
+            progress.add(checked=1)
+            if obj_findings:
+                with results_lock:
+                    results.append((key, obj_findings))
+
+        def submit(key):
+            in_flight.acquire()
+            future = acl_pool.submit(check_object_acl, s3_client, bucket_name, key)
+            future.add_done_callback(lambda f: on_done(f, key))
+
+        def check_listed_async(keys):
+            # One listing page at a time; the engine's s3 semaphore bounds the requests in flight
+            responses = async_engine.call_many(
+                s3_client, 'get_object_acl', [{'Bucket': bucket_name, 'Key': key} for key in keys]
+            )
+            for key, (obj_acl, error) in zip(keys, responses):
+                if error is not None:
+                    progress.add(checked=1, errors=1)
+                    continue
+                progress.add(checked=1)
+                obj_findings = is_cross_account_acl(obj_acl['Grants'], obj_acl['Owner']['ID'])
+                if obj_findings:
+                    with results_lock:
+                        results.append((key, obj_findings))
+
+        def submit_listed(contents):
+            progress.add(listed=len(contents))
+            if async_engine.enabled():
+                check_listed_async([obj['Key'] for obj in contents])
+                return
+            for obj in contents:
+                submit(obj['Key'])
+
+        def list_prefix(prefix, max_items=None):
+            config = {'MaxItems': max_items} if max_items else {}
+            for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix, PaginationConfig=config):
+                submit_listed(page.get('Contents', []))
+
+        if not full:
+            list_prefix('', max_items=SAMPLE_SIZE)
+        else:
+            prefixes = split_keyspace(s3_client, bucket_name, list_workers, submit_listed)
+            with ThreadPoolExecutor(max_workers=list_workers) as list_pool:
+                list(list_pool.map(bind_context(list_prefix), prefixes))
+
+    return sorted(results)
+
+def resolve_bucket_regions(s3_client, buckets, region_cache, max_workers=8):
+    """Fill `region_cache` for every bucket and return the names that could not be resolved.
+
+    The `BucketRegion` field from list_buckets is authoritative when present;
+    otherwise a cached region is reused and get_bucket_location is the last
+    resort, run concurrently for the buckets that need it.
+    """
+    to_locate = []
     for bucket in buckets:
         bucket_name = bucket['Name']
-        bucket_findings = []
+        if bucket.get('BucketRegion'):
+            region_cache[bucket_name] = bucket['BucketRegion']
+        elif bucket_name not in region_cache:
+            to_locate.append(bucket_name)
 
-        # Get the bucket's region
-        bucket_region = get_bucket_region(s3, bucket_name)
-        if not bucket_region:
-            continue
+    unresolved = []
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        located = pool.map(lambda name: get_bucket_region(s3_client, name), to_locate)
+        for bucket_name, bucket_region in zip(to_locate, located):
+            if bucket_region:
+                region_cache[bucket_name] = bucket_region
+            else:
+                unresolved.append(bucket_name)
+    return unresolved
 
-        # Use a region-specific client for all operations
-        region_s3 = boto3.client('s3', region_name=bucket_region)
+def check_bucket_access(region_s3, bucket_name, current_account):
+    """Check the bucket policy and ACL; returns (findings, complete) where complete is False on errors."""
+    region = region_s3.meta.region_name
+    bucket_findings = []
+    complete = True
 
-        # Check bucket policy
-        try:
-            policy_str = region_s3.get_bucket_policy(Bucket=bucket_name)['Policy']
-            policy = json.loads(policy_str)
-            for statement in policy.get('Statement', []):
-                if is_cross_account_or_org_policy(statement, current_account):
-                    bucket_findings.append("  [!] Cross-account or organization permission in bucket policy:\n" +
-                                          json.dumps(statement, indent=2))
-        except ClientError as e:
-            if e.response['Error']['Code'] != 'NoSuchBucketPolicy':
-                bucket_findings.append(f"  Error accessing policy: {e}")
+    # Check bucket policy
+    try:
+        policy_str = region_s3.get_bucket_policy(Bucket=bucket_name)['Policy']
+        analyses = analyze_policy(policy_str, current_account)
+        if analyses:
+            statements = policy_statements(json.loads(policy_str))
+            for analysis in analyses:
+                bucket_findings.append(Finding('s3', 'bucket-policy', current_account, region, bucket_name,
+                                               access_principals(analysis), statements[analysis.index]))
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'NoSuchBucketPolicy':
+            bucket_findings.append(Finding('s3', 'error', current_account, region, bucket_name, (),
+                                           f"Error accessing policy: {e}"))
+            complete = False
 
-        # Check bucket ACL
-        try:
-            acl = region_s3.get_bucket_acl(Bucket=bucket_name)
-            findings = is_cross_account_acl(acl['Grants'], acl['Owner']['ID'])
-            if findings:
-                bucket_findings.append("  [!] Cross-account or group permissions in bucket ACL:\n" +
-                                      "\n".join([f"      - {f}" for f in findings]))
-        except ClientError as e:
-            bucket_findings.append(f"  Error accessing bucket ACL: {e}")
+    # Check bucket ACL
+    try:
+        acl = region_s3.get_bucket_acl(Bucket=bucket_name)
+        grantees = is_cross_account_acl(acl['Grants'], acl['Owner']['ID'])
+        if grantees:
+            bucket_findings.append(Finding('s3', 'bucket-acl', current_account, region, bucket_name, tuple(grantees)))
+    except ClientError as e:
+        bucket_findings.append(Finding('s3', 'error', current_account, region, bucket_name, (),
+                                       f"Error accessing bucket ACL: {e}"))
+        complete = False
 
-        # Check object ACLs (sampled: first 1000 objects)
+    return bucket_findings, complete
+
+def scan_bucket(region_s3, bucket_name, current_account, args, store=None, changed=None):
+    bucket_arn = f"arn:aws:s3:::{bucket_name}"
+    region = region_s3.meta.region_name
+    bucket_findings = None
+    if store and changed is not None and bucket_name not in changed:
+        rows = store.lookup(bucket_arn)
+        bucket_findings = from_rows(rows) if rows is not None else None
+    if bucket_findings is None:
+        bucket_findings, complete = check_bucket_access(region_s3, bucket_name, current_account)
+        if store and complete:
+            store.put(bucket_arn, 's3', None, to_rows(bucket_findings))
+
+    # Check object ACLs
+    if args.object_scan != 'none':
         try:
-            paginator = region_s3.get_paginator('list_objects_v2')
-            for page in paginator.paginate(Bucket=bucket_name, PaginationConfig={'MaxItems': 1000}):
-                for obj in page.get('Contents', []):
-                    key = obj['Key']
-                    try:
-                        obj_acl = region_s3.get_object_acl(Bucket=bucket_name, Key=key)
-                        obj_findings = is_cross_account_acl(obj_acl['Grants'], obj_acl['Owner']['ID'])
-                        if obj_findings:
-                            bucket_findings.append(
-                                f"  [!] Object '{key}' has cross-account or group permissions in ACL:\n" +
-                                "\n".join([f"      - {f}" for f in obj_findings])
-                            )
-                    except ClientError:
-                        continue
-                break  # Remove this break to scan all objects (may be slow)
+            if is_bucket_owner_enforced(region_s3, bucket_name):
+                print(f"  Skipping object ACLs for {bucket_name}: BucketOwnerEnforced (ACLs disabled)", file=sys.stderr)
+            else:
+                flagged = scan_object_acls(
+                    region_s3,
+                    bucket_name,
+                    full=(args.object_scan == 'full'),
+                    list_workers=args.list_workers,
+                    acl_workers=args.acl_workers
+                )
+                bucket_findings.extend(
+                    Finding('s3', 'object-acl', current_account, region, bucket_name, tuple(grantees), key)
+                    for key, grantees in flagged
+                )
         except ClientError as e:
-            bucket_findings.append(f"  Error listing objects: {e}")
+            bucket_findings.append(Finding('s3', 'error', current_account, region, bucket_name, (),
+                                           f"Error listing objects: {e}"))
+
+    return bucket_findings
+
+def main(argv=None):
+    args = parse_args(argv)
+    store = snapshot_store.open_store(args)
+    # Every bucket worker's ACL and listing workers share one client per region
+    set_max_pool_connections(args.bucket_workers * (args.acl_workers + args.list_workers))
+    s3 = get_client('s3')
+    sts = get_client('sts')
+    current_account = sts.get_caller_identity()['Account']
+
+    buckets = s3.list_buckets()['Buckets']
+    total_buckets = len(buckets)
+    findings_found = False
+
+    # Bucket regions never change for an existing bucket, so keep them across runs
+    region_cache = load_json(BUCKET_REGION_CACHE, default={})
+    resolve_bucket_regions(s3, buckets, region_cache, max_workers=args.bucket_workers)
+    update_json(BUCKET_REGION_CACHE, region_cache)
+
+    # Bucket policies and ACLs only change through these calls; with a previous
+    # scan on record, only buckets named in their CloudTrail events are rechecked
+    started_at = time.time()
+    bucket_regions = sorted({region_cache[b['Name']] for b in buckets if b['Name'] in region_cache})
+    changed_by_region = {}
+    if store:
+        for region_result in run_in_regions(
+            bucket_regions,
+            lambda region: snapshot_store.changed_since(
+                region, S3_CHANGE_EVENTS, store.last_scan(f"s3:{current_account}:{region}")
+            )
+        ):
+            changed, history_error = region_result.result or (None, region_result.error)
+            if history_error is not None:
+                print(snapshot_store.history_warning(region_result.region, history_error))
+            changed_by_region[region_result.region] = changed
+
+    def scan_one(bucket):
+        bucket_name = bucket['Name']
+        bucket_region = region_cache.get(bucket_name)
+        if not bucket_region:
+            return bucket_name, None, []
+        return bucket_name, bucket_region, scan_bucket(
+            get_client('s3', bucket_region), bucket_name, current_account, args,
+            store, changed_by_region.get(bucket_region)
+        )
+
+    print("Scanning S3 buckets for cross-account and organization permissions...\n")
+    with ThreadPoolExecutor(max_workers=args.bucket_workers) as pool:
+        for bucket_name, bucket_region, bucket_findings in pool.map(bind_context(scan_one), buckets):
+            if bucket_findings:
+                findings_found = True
+                print(f"\nBucket: {bucket_name} (Region: {bucket_region})")
+                for finding in bucket_findings:
+                    emit(finding)
 
-        if bucket_findings:
-            findings_found = True
-            print(f"\nBucket: {bucket_name} (Region: {bucket_region})")
-            for finding in bucket_findings:
-                print(finding)
+    if store:
+        for region in bucket_regions:
+            store.finish_scan(f"s3:{current_account}:{region}", started_at)
+        print(store.summary())
+        store.close()
 
     print(f"\nScan complete. Buckets scanned: {total_buckets}")
     if not findings_found:
@@ -0,0 +1,102 @@
+import argparse
+import inspect
+import sys
+
+from scanners import SCANNERS, load_scanner
+
+ORG_COMMAND = 'org'
+
+def build_parser():
+    commands = [(name, description) for name, (_, description) in SCANNERS.items()]
+    commands.append((ORG_COMMAND, "Run a scanner in every account of the organization"))
+    parser = argparse.ArgumentParser(
+        description="Scan an AWS account for resources and settings that matter when moving it between organizations.",
+        epilog="commands:\n" + "\n".join(f"  {name:<26}{description}" for name, description in commands) +
+               "\n\nRun '%(prog)s <command> --help' for a command's own options.",
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('--telemetry', action='store_true',
+                        help="Record per-operation API call statistics and print a summary to stderr at the end")
+    parser.add_argument('--telemetry-json', metavar='PATH', help="Also write the statistics as JSON (implies --telemetry)")
+    parser.add_argument('--telemetry-prom', metavar='PATH',
+                        help="Also write them as a Prometheus textfile, e.g. for the node exporter (implies --telemetry)")
+    parser.add_argument('--findings-jsonl', metavar='PATH',
+                        help="Also stream findings to PATH as JSON lines while they are produced")
+    parser.add_argument('--rate-limit', action='store_true',
+                        help="Pace API calls with adaptive token buckets per (account, region, service)")
+    parser.add_argument('--rate', action='append', metavar='SERVICE=RATE',
+                        help="Starting requests per second for a service, e.g. kms=100 (repeatable, implies --rate-limit)")
+    parser.add_argument('--default-rate', type=float, metavar='RATE',
+                        help="Starting requests per second for services without a built-in rate (implies --rate-limit)")
+    parser.add_argument('--async-engine', action='store_true',
+                        help="Run per-resource API calls (key policies, function policies, AMI launch permissions, "
+                             "object ACLs, account assignments) as coroutines on aiobotocore; requires aiobotocore")
+    parser.add_argument('--async-limit', action='append', metavar='SERVICE=LIMIT',
+                        help="Requests in flight for a service on the async engine, e.g. s3=1000 "
+                             "(repeatable, implies --async-engine)")
+    # Only names and descriptions are registered here; each scanner parses its
+    # own arguments and is only imported once chosen, so everything after the
+    # command is passed to it untouched
+    parser.add_argument('command', choices=[name for name, _ in commands], metavar='command',
+                        help="The scanner to run, or 'org' (see below)")
+    parser.add_argument('args', nargs=argparse.REMAINDER, metavar='ARGS', help="Options for the command")
+    return parser
+
+def parse_args(argv=None):
+    """Return (options, arguments for the command)."""
+    args = build_parser().parse_args(argv)
+    return args, args.args
+
+def run_scanner(command, main, args):
+    if inspect.signature(main).parameters:
+        return main(args)
+    if args in (['-h'], ['--help']):
+        print(f"{command} takes no options.")
+        return None
+    if args:
+        raise SystemExit(f"unrecognized arguments: {' '.join(args)}")
+    return main()
+
+def run_command(command, args):
+    if command == ORG_COMMAND:
+        # Imported here so single-account commands never load the multi-account machinery
+        import org_scan
+        return org_scan.main(args)
+    return run_scanner(command, load_scanner(command), args)
+
+def main(argv=None):
+    options, args = parse_args(argv)
+    reports = []
+    if options.findings_jsonl:
+        import findings
+        findings.open_jsonl(options.findings_jsonl)
+        reports.append(findings.close)
+    if options.telemetry or options.telemetry_json or options.telemetry_prom:
+        import telemetry
+        telemetry.enable()
+        reports.append(lambda: telemetry.report(json_path=options.telemetry_json,
+                                                prometheus_path=options.telemetry_prom))
+    if options.rate_limit or options.rate or options.default_rate:
+        import rate_limit
+        try:
+            rates = rate_limit.parse_rates(options.rate)
+        except ValueError as e:
+            raise SystemExit(str(e))
+        rate_limit.enable(rates, options.default_rate or rate_limit.DEFAULT_RATE)
+        reports.append(rate_limit.report)
+    if options.async_engine or options.async_limit:
+        import async_engine
+        try:
+            limits = async_engine.parse_limits(options.async_limit)
+        except ValueError as e:
+            raise SystemExit(str(e))
+        async_engine.enable(limits)
+        reports.append(async_engine.close)
+    try:
+        return run_command(options.command, args)
+    finally:
+        for report in reports:
+            report()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,49 @@
+import importlib.util
+import os
+from collections import OrderedDict
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Subcommand name -> (script file, one-line description). Kept as plain data so
+# listing the scanners never imports boto3 or any scanner module.
+SCANNERS = OrderedDict([
+    ('ami', ('ami.py', "AMIs shared with other accounts or public")),
+    ('ami-exclude-awsbackup', ('ami-exclude-awsbackup.py', "Shared AMIs, skipping AWS Backup-created images")),
+    ('backups', ('backups.py', "Backup recovery points copied from other accounts")),
+    ('event-bridge', ('event-bridge.py', "EventBridge bus policies allowing other accounts")),
+    ('iam', ('iam.py', "IAM trust and identity policies reaching other accounts")),
+    ('kms', ('kms.py', "KMS key policies allowing other accounts or organizations")),
+    ('lambda', ('lambda.py', "Lambda resource policies allowing other accounts")),
+    ('org-delegated-services', ('org-delegated-services.py', "Delegated administrator accounts and their services")),
+    ('org-policy-types', ('org-policy-types.py', "Organization policy types enabled on the root")),
+    ('org-trusted-access', ('org-trusted-acces.py', "Services with trusted access to the organization")),
+    ('ram', ('ram.py', "Resources shared through RAM")),
+    ('region-service-discover', ('region-service-discover.py', "Regions and services ranked by cost")),
+    ('s3', ('s3.py', "S3 bucket and object access from other accounts")),
+    ('security-services', ('security-services.py', "Config, Security Hub, GuardDuty and CloudTrail per region")),
+    ('sso-report', ('sso-report.py', "IAM Identity Center assignments report")),
+])
+
+def script_path(script):
+    """Resolve a subcommand name, script file name or path to a script path."""
+    if script in SCANNERS:
+        script = SCANNERS[script][0]
+    path = script if os.path.isabs(script) else os.path.join(SCRIPTS_DIR, script)
+    if not path.endswith('.py'):
+        path += '.py'
+    return path
+
+def load_module(script):
+    """Import a scanner script (hyphenated file names included) as a module."""
+    path = script_path(script)
+    name = 'scan_' + os.path.basename(path)[:-3].replace('-', '_')
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def load_scanner(script):
+    module = load_module(script)
+    if not callable(getattr(module, 'main', None)):
+        raise SystemExit(f"{script} has no main() function")
+    return module.main
@@ -1,18 +1,17 @@
-import boto3
+import os
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
 from botocore.exceptions import ClientError
 
-def get_enabled_regions():
-    ec2 = boto3.client('ec2', region_name='us-east-1')
-    regions = ec2.describe_regions(AllRegions=True)
-    enabled = [
-        r['RegionName']
-        for r in regions['Regions']
-        if r['OptInStatus'] in ('opt-in-not-required', 'opted-in')
-    ]
-    return enabled
+from clients import get_client
+from fanout import bind_context, run_in_regions
+from regions import get_enabled_regions
+
+PROBE_WORKERS = int(os.environ.get('SECURITY_PROBE_WORKERS', '16'))
 
 def check_config(region):
-    client = boto3.client('config', region_name=region)
+    client = get_client('config', region)
     try:
         recorders = client.describe_configuration_recorders()
         return len(recorders.get('ConfigurationRecorders', [])) > 0
@@ -20,61 +19,108 @@ def check_config(region):
         return False
 
 def check_securityhub(region):
-    client = boto3.client('securityhub', region_name=region)
+    # describe_hub returns one small record, or an error if the account is not subscribed
+    client = get_client('securityhub', region)
     try:
-        status = client.get_findings()
+        client.describe_hub()
         return True
-    except ClientError as e:
-        if e.response['Error']['Code'] in ['InvalidAccessException', 'AccessDeniedException', 'InvalidInputException', 'ResourceNotFoundException']:
-            return False
+    except ClientError:
         return False
 
 def check_guardduty(region):
-    client = boto3.client('guardduty', region_name=region)
+    client = get_client('guardduty', region)
     try:
-        detectors = client.list_detectors()
+        detectors = client.list_detectors(MaxResults=1)
         return len(detectors.get('DetectorIds', [])) > 0
     except ClientError:
         return False
 
-def get_cloudtrails(region):
-    client = boto3.client('cloudtrail', region_name=region)
+# Report column -> (botocore service name, probe)
+PROBES = OrderedDict([
+    ('Config', ('config', check_config)),
+    ('SecurityHub', ('securityhub', check_securityhub)),
+    ('GuardDuty', ('guardduty', check_guardduty)),
+])
+
+def get_cloudtrails_by_region(region):
+    """Return {home region: [trail names]} for the account's own (non-organization) trails.
+
+    list_trails returns every trail in the account with its home region, and
+    describe_trails with their ARNs and shadow trails included returns all of
+    their details from a single region, so two calls replace one
+    describe_trails per region.
+    """
+    client = get_client('cloudtrail', region)
+    trails_by_region = defaultdict(list)
     try:
-        trails = client.describe_trails(includeShadowTrails=False)
-        # Only custom trails (not shadow trails)
-        custom_trails = [t['Name'] for t in trails.get('trailList', []) if not t.get('IsOrganizationTrail', False)]
-        return custom_trails
+        arns = []
+        paginator = client.get_paginator('list_trails')
+        for page in paginator.paginate():
+            arns.extend(t['TrailARN'] for t in page.get('Trails', []))
+        if not arns:
+            return trails_by_region
+        trails = client.describe_trails(trailNameList=arns, includeShadowTrails=True)
     except ClientError:
-        return []
+        return trails_by_region
+    for trail in trails.get('trailList', []):
+        if not trail.get('IsOrganizationTrail', False):
+            trails_by_region[trail['HomeRegion']].append(trail['Name'])
+    return trails_by_region
+
+def probe_units(regions):
+    """Every (region, column) pair to probe, skipping regions where the service is not offered."""
+    units = []
+    for column, (service, _) in PROBES.items():
+        offered = set(get_enabled_regions(service))
+        units.extend((region, column) for region in regions if region in offered)
+    return units
+
+def run_probe(unit):
+    region, column = unit
+    return PROBES[column][1](region)
+
+def probe_regions(regions):
+    """Run every (region, service) probe and the CloudTrail lookup concurrently.
+
+    Returns one dict per region. A service that is not offered in a region is
+    reported as None, and a probe that failed as its exception.
+    """
+    results = OrderedDict(
+        (region, dict({'Region': region}, **{column: None for column in PROBES})) for region in regions
+    )
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        trails = pool.submit(bind_context(get_cloudtrails_by_region), regions[0])
+        for unit_result in run_in_regions(probe_units(regions), run_probe, max_workers=PROBE_WORKERS):
+            region, column = unit_result.region
+            results[region][column] = unit_result.result if unit_result.error is None else unit_result.error
+        trails_by_region = trails.result()
+    for region, result in results.items():
+        result['CloudTrails'] = sorted(trails_by_region.get(region, []))
+    return list(results.values())
+
+def format_status(value):
+    if value is None:
+        return 'N/A'
+    if isinstance(value, Exception):
+        return f"Error ({value})"
+    return 'Yes' if value else 'No'
 
 def main():
     regions = get_enabled_regions()
     print(f"Checking {len(regions)} enabled regions...")
-    results = []
-
-    for region in regions:
-        config_enabled = check_config(region)
-        securityhub_enabled = check_securityhub(region)
-        guardduty_enabled = check_guardduty(region)
-        cloudtrails = get_cloudtrails(region)
-
-        results.append({
-            'Region': region,
-            'Config': config_enabled,
-            'SecurityHub': securityhub_enabled,
-            'GuardDuty': guardduty_enabled,
-            'CloudTrails': cloudtrails
-        })
+    if not regions:
+        return
+    results = probe_regions(regions)
 
     print("\nSummary:")
     for r in results:
         cloudtrail_names = ', '.join(r['CloudTrails']) if r['CloudTrails'] else 'None'
         print(
-            f"{r['Region']}: Config={'Yes' if r['Config'] else 'No'}, "
-            f"SecurityHub={'Yes' if r['SecurityHub'] else 'No'}, "
-            f"GuardDuty={'Yes' if r['GuardDuty'] else 'No'}, "
+            f"{r['Region']}: Config={format_status(r['Config'])}, "
+            f"SecurityHub={format_status(r['SecurityHub'])}, "
+            f"GuardDuty={format_status(r['GuardDuty'])}, "
             f"CloudTrails={cloudtrail_names}"
         )
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,193 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+
+from clients import get_client
+from local_cache import cache_path
+
+DEFAULT_PATH = cache_path('snapshots.sqlite3')
+# CloudTrail event history only goes back 90 days
+CLOUDTRAIL_HISTORY = timedelta(days=89)
+# Allowance for CloudTrail delivery delay and clock skew
+CLOUDTRAIL_MARGIN = timedelta(minutes=15)
+
+# Bumped when the stored findings change shape; older snapshots are discarded
+# (version 2: findings.Finding rows instead of text lines; version 3: IAM
+# trust findings as Finding rows too)
+FORMAT_VERSION = 3
+
+Snapshot = namedtuple('Snapshot', ['marker', 'findings', 'scanned_at'])
+
+# Marker for lookups where change detection happened elsewhere (CloudTrail)
+ANY = object()
+
+# One connection per database file per process, shared by every store opened
+# on it. Concurrent account scans in org mode each open their own store; with
+# separate connections the first put's open write transaction would lock the
+# others out until that scan finished.
+_connections = {}
+_connections_lock = threading.Lock()
+
+def _connect(path):
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.executescript('''
+        CREATE TABLE IF NOT EXISTS snapshots (
+            arn TEXT PRIMARY KEY,
+            scanner TEXT NOT NULL,
+            marker TEXT,
+            findings TEXT NOT NULL,
+            scanned_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS scans (
+            scope TEXT PRIMARY KEY,
+            started_at REAL NOT NULL
+        );
+    ''')
+    if conn.execute('PRAGMA user_version').fetchone()[0] < FORMAT_VERSION:
+        conn.executescript(f'''
+            DELETE FROM snapshots;
+            DELETE FROM scans;
+            PRAGMA user_version = {FORMAT_VERSION};
+        ''')
+    return conn
+
+def _acquire_connection(path):
+    key = os.path.abspath(path)
+    with _connections_lock:
+        entry = _connections.get(key)
+        if entry is None:
+            entry = _connections[key] = [_connect(path), threading.Lock(), 0]
+        entry[2] += 1
+        return entry[0], entry[1]
+
+def _release_connection(path):
+    key = os.path.abspath(path)
+    with _connections_lock:
+        entry = _connections[key]
+        entry[2] -= 1
+        if entry[2] == 0:
+            del _connections[key]
+            with entry[1]:
+                entry[0].close()
+
+class SnapshotStore:
+    """Local SQLite store of per-resource change markers and last classification.
+
+    Each resource (keyed by ARN) keeps the marker it was classified under,
+    e.g. a Lambda RevisionId or a policy hash, and the findings produced at
+    the time, so an unchanged resource can be reported without fetching or
+    analyzing its policy again. Completed scans are recorded per scope (e.g.
+    'kms:<account>:<region>') for change detection based on timestamps.
+    """
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self._conn, self._lock = _acquire_connection(path)
+        self.reused = 0
+        self.updated = 0
+
+    def get(self, arn):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT marker, findings, scanned_at FROM snapshots WHERE arn = ?', (arn,)
+            ).fetchone()
+        if row is None:
+            return None
+        return Snapshot(row[0], json.loads(row[1]), row[2])
+
+    def lookup(self, arn, marker=ANY):
+        """Return the stored findings if `arn` was last classified under `marker`, else None.
+
+        With the default `ANY`, any stored snapshot is returned; use it when the
+        caller already knows the resource has not changed.
+        """
+        snapshot = self.get(arn)
+        with self._lock:
+            if snapshot is not None and (marker is ANY or snapshot.marker == marker):
+                self.reused += 1
+                return snapshot.findings
+        return None
+
+    def put(self, arn, scanner, marker, findings):
+        with self._lock:
+            self.updated += 1
+            self._conn.execute(
+                'INSERT OR REPLACE INTO snapshots (arn, scanner, marker, findings, scanned_at) VALUES (?, ?, ?, ?, ?)',
+                (arn, scanner, marker, json.dumps(findings), time.time())
+            )
+
+    def last_scan(self, scope):
+        with self._lock:
+            row = self._conn.execute('SELECT started_at FROM scans WHERE scope = ?', (scope,)).fetchone()
+        return row[0] if row else None
+
+    def finish_scan(self, scope, started_at):
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO scans (scope, started_at) VALUES (?, ?)', (scope, started_at)
+            )
+            self._conn.commit()
+
+    def commit(self):
+        with self._lock:
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.commit()
+        _release_connection(self.path)
+
+    def summary(self):
+        return f"Snapshot store {self.path}: {self.reused} unchanged resources reused, {self.updated} classified"
+
+def changed_since(region, event_names, since):
+    """Return (names, error) for resources touched by any of `event_names` in CloudTrail since `since`.
+
+    `names` is None when there is no usable baseline (no previous scan, older
+    than CloudTrail's event history, or lookup_events failed), in which case
+    every resource must be treated as changed. `error` is the lookup failure,
+    if any, for the caller to report with the rest of the region's output
+    (see history_warning); region workers must not print it themselves.
+    """
+    if since is None:
+        return None, None
+    start = datetime.fromtimestamp(since, timezone.utc) - CLOUDTRAIL_MARGIN
+    if datetime.now(timezone.utc) - start > CLOUDTRAIL_HISTORY:
+        return None, None
+    cloudtrail = get_client('cloudtrail', region)
+    paginator = cloudtrail.get_paginator('lookup_events')
+    changed = set()
+    try:
+        for event_name in event_names:
+            for page in paginator.paginate(
+                LookupAttributes=[{'AttributeKey': 'EventName', 'AttributeValue': event_name}],
+                StartTime=start
+            ):
+                for event in page['Events']:
+                    for resource in event.get('Resources', []):
+                        name = resource.get('ResourceName')
+                        if name:
+                            changed.add(name)
+                            changed.add(name.split('/')[-1])
+    except Exception as e:
+        return None, e
+    return changed, None
+
+def history_warning(region, error):
+    return f"  Could not read CloudTrail history in {region}, rescanning everything: {error}"
+
+def add_arguments(parser):
+    parser.add_argument('--incremental', action='store_true',
+                        help="Skip resources unchanged since the last scan, reusing findings from the snapshot store")
+    parser.add_argument('--snapshot-db', default=DEFAULT_PATH, help=f"Snapshot store path (default: {DEFAULT_PATH})")
+
+def open_store(args):
+    """Return a SnapshotStore if --incremental was given, else None."""
+    if not args.incremental:
+        return None
+    os.makedirs(os.path.dirname(os.path.abspath(args.snapshot_db)), exist_ok=True)
+    return SnapshotStore(args.snapshot_db)
@@ -1,11 +1,29 @@
-import boto3
-import pandas as pd
-from botocore.exceptions import ClientError
+import argparse
+import os
 
-def get_enabled_regions():
-    ec2 = boto3.client('ec2')
-    regions = ec2.describe_regions(AllRegions=False)
-    return [r['RegionName'] for r in regions['Regions']]
+from async_engine import call_many
+from clients import get_client
+from fanout import run_in_regions
+from principal_directory import PrincipalDirectory
+from regions import get_enabled_regions
+from report_sink import FORMATS, open_sink
+
+# list_account_assignments pairs requested per batch, and threads per batch
+# when the async engine is not enabled
+ASSIGNMENT_BATCH = 1000
+ASSIGNMENT_WORKERS = int(os.environ.get('SSO_ASSIGNMENT_WORKERS', '8'))
+
+REPORT_FIELDS = [
+    'Region',
+    'InstanceArn',
+    'IdentityProviderType',
+    'IdentityProviderDetails',
+    'AccountId',
+    'AccountName',
+    'PermissionSetArn',
+    'PrincipalType',
+    'PrincipalName'
+]
 
 def list_sso_instances(sso_admin):
     instances = []
@@ -14,6 +32,10 @@ def list_sso_instances(sso_admin):
         instances.extend(page['Instances'])
     return instances
 
+def find_sso_instances(region):
+    sso_admin = get_client('sso-admin', region)
+    return sso_admin, list_sso_instances(sso_admin)
+
 def get_identity_provider_info(sso_admin, instance_arn):
     try:
         response = sso_admin.describe_instance(InstanceArn=instance_arn)
@@ -25,97 +47,148 @@ def get_identity_provider_info(sso_admin, instance_arn):
     except Exception as e:
         return 'Unknown', {}
 
-def main():
-    session = boto3.Session()
-    org_client = session.client('organizations')
-    identitystore = session.client('identitystore')
+def get_principal_directory(directories, region, identity_store_id):
+    if identity_store_id not in directories:
+        identitystore = get_client('identitystore', region)
+        directories[identity_store_id] = PrincipalDirectory(identitystore, identity_store_id).load()
+    return directories[identity_store_id]
+
+def list_permission_sets(sso_admin, instance_arn):
+    paginator = sso_admin.get_paginator('list_permission_sets')
+    permission_sets = []
+    for page in paginator.paginate(InstanceArn=instance_arn):
+        permission_sets.extend(page['PermissionSets'])
+    return permission_sets
+
+def list_org_accounts(org_client):
+    accounts = []
+    paginator = org_client.get_paginator('list_accounts')
+    for page in paginator.paginate():
+        accounts.extend(page['Accounts'])
+    return accounts
+
+def find_provisioned_pairs(sso_admin, instance_arn, permission_sets):
+    """Return the (account_id, permission_set_arn) pairs that are provisioned.
+
+    Assignments can only exist where a permission set has been provisioned, so
+    this bounds list_account_assignments to pairs that can return rows.
+    """
+    pairs = set()
+    paginator = sso_admin.get_paginator('list_accounts_for_provisioned_permission_set')
+    for ps_arn in permission_sets:
+        for page in paginator.paginate(InstanceArn=instance_arn, PermissionSetArn=ps_arn):
+            for account_id in page['AccountIds']:
+                pairs.add((account_id, ps_arn))
+    return pairs
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Report IAM Identity Center account assignments across the organization.")
+    parser.add_argument(
+        '--assignment-discovery',
+        choices=['provisioned', 'exhaustive'],
+        default='provisioned',
+        help="'provisioned' only queries account/permission set pairs the permission set is provisioned to; "
+             "'exhaustive' queries every pair (default: provisioned)"
+    )
+    parser.add_argument(
+        '--output',
+        default='aws_sso_report_all_regions_with_idp.csv',
+        help="Report file path (default: aws_sso_report_all_regions_with_idp.csv)"
+    )
+    parser.add_argument(
+        '--format',
+        choices=FORMATS,
+        help="Report format; inferred from the --output extension when omitted"
+    )
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    discovery = args.assignment_discovery
+    org_client = get_client('organizations')
+
+    # List accounts in the org once per run
+    accounts = list_org_accounts(org_client)
 
     # Discover all enabled regions
-    regions = get_enabled_regions()
+    regions = get_enabled_regions('sso-admin')
     print("Enabled AWS regions:", regions)
 
-    report_rows = []
-
-    for region in regions:
-        print(f"Checking region: {region}")
-        sso_admin = session.client('sso-admin', region_name=region)
-        try:
-            sso_instances = list_sso_instances(sso_admin)
-        except ClientError as e:
-            print(f"Could not query SSO in {region}: {e}")
-            continue
-
-        if not sso_instances:
-            continue
-
-        for instance in sso_instances:
-            instance_arn = instance['InstanceArn']
-            identity_store_id = instance['IdentityStoreId']
-
-            # Get identity provider info
-            provider_type, provider_details = get_identity_provider_info(sso_admin, instance_arn)
-            print(f"Found SSO instance in {region}: {instance_arn} (Provider: {provider_type})")
-
-            # Example: List permission sets for this instance
-            paginator = sso_admin.get_paginator('list_permission_sets')
-            permission_sets = []
-            for page in paginator.paginate(InstanceArn=instance_arn):
-                permission_sets.extend(page['PermissionSets'])
-
-            # Example: List accounts in the org
-            accounts = []
-            paginator = org_client.get_paginator('list_accounts')
-            for page in paginator.paginate():
-                accounts.extend(page['Accounts'])
-
-            # Example: For each account and permission set, list assignments
-            for account in accounts:
-                account_id = account['Id']
-                account_name = account['Name']
-                for ps_arn in permission_sets:
-                    paginator = sso_admin.get_paginator('list_account_assignments')
-                    for page in paginator.paginate(
-                        InstanceArn=instance_arn,
-                        AccountId=account_id,
-                        PermissionSetArn=ps_arn
-                    ):
-                        for assignment in page['AccountAssignments']:
+    # Closed on errors too, so a partial report is still a complete file (Parquet needs its footer)
+    with open_sink(args.output, REPORT_FIELDS, args.format) as report:
+        # One principal directory per identity store, shared across regions/instances
+        directories = {}
+
+        region_results = run_in_regions(regions, find_sso_instances)
+
+        for region_result in region_results:
+            region = region_result.region
+            print(f"Checking region: {region}")
+            if region_result.error is not None:
+                print(f"Could not query SSO in {region}: {region_result.error}")
+                continue
+            sso_admin, sso_instances = region_result.result
+
+            if not sso_instances:
+                continue
+
+            for instance in sso_instances:
+                instance_arn = instance['InstanceArn']
+                identity_store_id = instance['IdentityStoreId']
+
+                # Get identity provider info
+                provider_type, provider_details = get_identity_provider_info(sso_admin, instance_arn)
+                print(f"Found SSO instance in {region}: {instance_arn} (Provider: {provider_type})")
+
+                directory = get_principal_directory(directories, region, identity_store_id)
+
+                permission_sets = list_permission_sets(sso_admin, instance_arn)
+
+                # For each account and permission set that has something to report, list assignments
+                if discovery == 'provisioned':
+                    pairs = find_provisioned_pairs(sso_admin, instance_arn, permission_sets)
+                else:
+                    pairs = None
+                targets = [
+                    (account, ps_arn)
+                    for account in accounts
+                    for ps_arn in permission_sets
+                    if pairs is None or (account['Id'], ps_arn) in pairs
+                ]
+                # Assignments are listed in batches, concurrently on a thread pool or
+                # on the async engine when it is enabled, and written in order
+                for start in range(0, len(targets), ASSIGNMENT_BATCH):
+                    batch = targets[start:start + ASSIGNMENT_BATCH]
+                    responses = call_many(
+                        sso_admin, 'list_account_assignments',
+                        [
+                            {'InstanceArn': instance_arn, 'AccountId': account['Id'], 'PermissionSetArn': ps_arn}
+                            for account, ps_arn in batch
+                        ],
+                        workers=ASSIGNMENT_WORKERS,
+                        result_key='AccountAssignments'
+                    )
+                    for (account, ps_arn), (assignments, error) in zip(batch, responses):
+                        if error is not None:
+                            raise error
+                        for assignment in assignments:
                             principal_type = assignment['PrincipalType']
                             principal_id = assignment['PrincipalId']
-                            # Look up user/group name
-                            try:
-                                if principal_type == 'USER':
-                                    user = identitystore.describe_user(
-                                        IdentityStoreId=identity_store_id,
-                                        UserId=principal_id
-                                    )
-                                    principal_name = user['UserName']
-                                elif principal_type == 'GROUP':
-                                    group = identitystore.describe_group(
-                                        IdentityStoreId=identity_store_id,
-                                        GroupId=principal_id
-                                    )
-                                    principal_name = group['DisplayName']
-                                else:
-                                    principal_name = 'Unknown'
-                            except Exception:
-                                principal_name = 'Unknown'
-                            report_rows.append({
+                            principal_name = directory.resolve(principal_type, principal_id)
+                            report.write({
                                 'Region': region,
                                 'InstanceArn': instance_arn,
                                 'IdentityProviderType': provider_type,
                                 'IdentityProviderDetails': str(provider_details),
-                                'AccountId': account_id,
-                                'AccountName': account_name,
+                                'AccountId': account['Id'],
+                                'AccountName': account['Name'],
                                 'PermissionSetArn': ps_arn,
                                 'PrincipalType': principal_type,
                                 'PrincipalName': principal_name
                             })
 
-    if report_rows:
-        df = pd.DataFrame(report_rows)
-        df.to_csv('aws_sso_report_all_regions_with_idp.csv', index=False)
-        print("Report generated: aws_sso_report_all_regions_with_idp.csv")
+    if report.count:
+        print(f"Report generated: {args.output} ({report.count} rows)")
     else:
         print("No SSO instances found in any region.")
 
@@ -0,0 +1,223 @@
+import io
+import json
+import zipfile
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+
+import boto3
+
+# Regions the synthetic org is spread over, in the order they are used
+REGIONS = [
+    'us-east-1', 'us-west-2', 'eu-west-1', 'eu-central-1', 'ap-southeast-2',
+    'ap-northeast-1', 'us-east-2', 'eu-north-1', 'ca-central-1', 'sa-east-1'
+]
+MEMBER_ROLE = 'OrganizationAccountAccessRole'
+# Account outside the synthetic org, granted access to every third resource
+EXTERNAL_ACCOUNT = '999999999999'
+
+OrgSpec = namedtuple('OrgSpec', ['accounts', 'regions', 'resources', 'permission_sets', 'objects_per_bucket'])
+SyntheticOrg = namedtuple('SyntheticOrg', ['management_account', 'accounts', 'regions'])
+
+def account_session(account_id, management_account):
+    """Return a session acting in `account_id` (moto scopes resources by the assumed role's account)."""
+    if account_id == management_account:
+        return boto3.Session()
+    creds = boto3.client('sts').assume_role(
+        RoleArn=f"arn:aws:iam::{account_id}:role/{MEMBER_ROLE}",
+        RoleSessionName='synthetic-org-setup'
+    )['Credentials']
+    return boto3.Session(
+        aws_access_key_id=creds['AccessKeyId'],
+        aws_secret_access_key=creds['SecretAccessKey'],
+        aws_session_token=creds['SessionToken']
+    )
+
+def grantee(index, account_id, accounts):
+    """Account granted access to resource `index`: every third goes outside the org, every third to a peer."""
+    if index % 3 == 0:
+        return EXTERNAL_ACCOUNT
+    if index % 3 == 1 and len(accounts) > 1:
+        return accounts[(accounts.index(account_id) + 1) % len(accounts)]
+    return None
+
+def allow_policy(principal_account, action, resource):
+    return json.dumps({
+        'Version': '2012-10-17',
+        'Statement': [{
+            'Effect': 'Allow',
+            'Principal': {'AWS': f"arn:aws:iam::{principal_account}:root"},
+            'Action': action,
+            'Resource': resource
+        }]
+    })
+
+def lambda_zip():
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        archive.writestr('index.py', 'def handler(event, context):\n    return event\n')
+    return buffer.getvalue()
+
+def create_kms_keys(session, account_id, accounts, region, count):
+    kms = session.client('kms', region_name=region)
+    for i in range(count):
+        other = grantee(i, account_id, accounts) or account_id
+        kms.create_key(Policy=allow_policy(other, 'kms:*', '*'), Description=f"synthetic key {i}")
+
+def create_lambda_functions(session, account_id, accounts, region, count):
+    iam = session.client('iam')
+    role_name = f"synthetic-lambda-{region}"
+    role = iam.create_role(RoleName=role_name, AssumeRolePolicyDocument=json.dumps({
+        'Version': '2012-10-17',
+        'Statement': [{'Effect': 'Allow', 'Principal': {'Service': 'lambda.amazonaws.com'}, 'Action': 'sts:AssumeRole'}]
+    }))['Role']
+    client = session.client('lambda', region_name=region)
+    code = lambda_zip()
+    for i in range(count):
+        name = f"synthetic-fn-{i}"
+        client.create_function(
+            FunctionName=name, Runtime='python3.12', Role=role['Arn'],
+            Handler='index.handler', Code={'ZipFile': code}
+        )
+        other = grantee(i, account_id, accounts)
+        if other:
+            client.add_permission(
+                FunctionName=name, StatementId='synthetic', Action='lambda:InvokeFunction', Principal=other
+            )
+
+def create_buckets(session, account_id, accounts, regions, count, objects_per_bucket):
+    for i in range(count):
+        region = regions[i % len(regions)]
+        s3 = session.client('s3', region_name=region)
+        bucket = f"synthetic-{account_id}-{i}"
+        params = {'Bucket': bucket}
+        if region != 'us-east-1':
+            params['CreateBucketConfiguration'] = {'LocationConstraint': region}
+        s3.create_bucket(**params)
+        other = grantee(i, account_id, accounts)
+        if other:
+            s3.put_bucket_policy(Bucket=bucket, Policy=allow_policy(other, 's3:GetObject', f"arn:aws:s3:::{bucket}/*"))
+        for j in range(objects_per_bucket):
+            s3.put_object(Bucket=bucket, Key=f"data/{j:06d}", Body=b'x')
+
+def create_images(session, account_id, accounts, region, count):
+    ec2 = session.client('ec2', region_name=region)
+    base_image = ec2.describe_images(Owners=['amazon'])['Images'][0]['ImageId']
+    instance_id = ec2.run_instances(ImageId=base_image, MinCount=1, MaxCount=1)['Instances'][0]['InstanceId']
+    for i in range(count):
+        image_id = ec2.create_image(InstanceId=instance_id, Name=f"synthetic-ami-{i}")['ImageId']
+        other = grantee(i, account_id, accounts)
+        if other:
+            ec2.modify_image_attribute(ImageId=image_id, LaunchPermission={'Add': [{'UserId': other}]})
+
+def create_event_bus_permission(session, account_id, accounts, region):
+    other = grantee(0, account_id, accounts)
+    session.client('events', region_name=region).put_permission(
+        EventBusName='default', Action='events:PutEvents', Principal=other, StatementId='synthetic'
+    )
+
+def create_backup_vault(session, region):
+    session.client('backup', region_name=region).create_backup_vault(BackupVaultName='synthetic-vault')
+
+def create_identity_center(session, region, accounts, permission_sets):
+    """Create permission sets, provisioned and with one user assignment per account, in the management account."""
+    sso_admin = session.client('sso-admin', region_name=region)
+    instances = sso_admin.list_instances()['Instances']
+    if not instances:
+        sso_admin.create_instance(Name='synthetic')
+        instances = sso_admin.list_instances()['Instances']
+    instance = instances[0]
+    identitystore = session.client('identitystore', region_name=region)
+    user_id = identitystore.create_user(
+        IdentityStoreId=instance['IdentityStoreId'], UserName='synthetic-user', DisplayName='Synthetic User',
+        Name={'GivenName': 'Synthetic', 'FamilyName': 'User'}
+    )['UserId']
+    for i in range(permission_sets):
+        ps_arn = sso_admin.create_permission_set(
+            Name=f"synthetic-ps-{i}", InstanceArn=instance['InstanceArn']
+        )['PermissionSet']['PermissionSetArn']
+        for account_id in accounts:
+            sso_admin.create_account_assignment(
+                InstanceArn=instance['InstanceArn'], TargetId=account_id, TargetType='AWS_ACCOUNT',
+                PermissionSetArn=ps_arn, PrincipalType='USER', PrincipalId=user_id
+            )
+        # The stand-in reports a provisioned permission set for the management
+        # account only, so provisioned discovery lists one pair per permission set
+        sso_admin.provision_permission_set(
+            InstanceArn=instance['InstanceArn'], PermissionSetArn=ps_arn, TargetType='ALL_PROVISIONED_ACCOUNTS'
+        )
+
+def build_org(spec):
+    """Populate the active local AWS stand-in with an organization sized by `spec`.
+
+    The caller's account becomes the management account and spec.accounts - 1
+    member accounts are created. Every account gets `resources` KMS keys,
+    Lambda functions and AMIs per region, `resources` S3 buckets spread over
+    the regions, an event bus permission and a backup vault per region. The
+    management account also gets `permission_sets` permission sets, each
+    provisioned and assigned in every account. About a third of the resources
+    grant access to an account outside the org and a third to a peer account.
+    Recovery points and RAM shares cannot be created in the stand-in; see
+    STUBBED_OPERATIONS.
+    """
+    regions = REGIONS[:spec.regions]
+    org = boto3.client('organizations')
+    org.create_organization(FeatureSet='ALL')
+    management_account = boto3.client('sts').get_caller_identity()['Account']
+    accounts = [management_account]
+    for i in range(spec.accounts - 1):
+        status = org.create_account(Email=f"member-{i}@example.com", AccountName=f"member-{i}")['CreateAccountStatus']
+        accounts.append(status['AccountId'])
+
+    for account_id in accounts:
+        session = account_session(account_id, management_account)
+        for region in regions:
+            create_kms_keys(session, account_id, accounts, region, spec.resources)
+            create_lambda_functions(session, account_id, accounts, region, spec.resources)
+            create_images(session, account_id, accounts, region, spec.resources)
+            create_event_bus_permission(session, account_id, accounts, region)
+            create_backup_vault(session, region)
+        create_buckets(session, account_id, accounts, regions, spec.resources, spec.objects_per_bucket)
+
+    create_identity_center(boto3.Session(), regions[0], accounts, spec.permission_sets)
+    return SyntheticOrg(management_account, accounts, regions)
+
+def stub_recovery_points(org, count):
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    return {'RecoveryPoints': [
+        {
+            'RecoveryPointArn': f"arn:aws:backup:{org.regions[0]}:{org.management_account}:recovery-point:synthetic-{i}",
+            'CreationDate': start + timedelta(hours=i),
+            'SourceAccountId': EXTERNAL_ACCOUNT if i % 3 == 0 else org.accounts[i % len(org.accounts)],
+        }
+        for i in range(count)
+    ]}
+
+def _share_arn(org, i):
+    return f"arn:aws:ram:{org.regions[0]}:{org.management_account}:resource-share/synthetic-{i}"
+
+def stub_ram_resources(org, count):
+    return {'resources': [
+        {
+            'arn': f"arn:aws:ec2:{org.regions[0]}:{org.management_account}:subnet/subnet-{i:017x}",
+            'type': 'ec2:Subnet',
+            'resourceShareArn': _share_arn(org, i),
+            'resourceRegionScope': 'REGIONAL',
+        }
+        for i in range(count)
+    ]}
+
+def stub_ram_principals(org, count):
+    return {'principals': [
+        {'id': EXTERNAL_ACCOUNT if i % 3 == 0 else org.accounts[i % len(org.accounts)],
+         'resourceShareArn': _share_arn(org, i), 'external': i % 3 == 0}
+        for i in range(count)
+    ]}
+
+# Operations the local stand-in does not implement ("Not yet implemented"),
+# mapped to a function (org, count) returning their response: `count`
+# synthetic items in a single page. Every vault and region gets the same items.
+STUBBED_OPERATIONS = {
+    ('backup', 'ListRecoveryPointsByBackupVault'): stub_recovery_points,
+    ('ram', 'ListResources'): stub_ram_resources,
+    ('ram', 'ListPrincipals'): stub_ram_principals,
+}
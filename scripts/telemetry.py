@@ -0,0 +1,217 @@
+import bisect
+import json
+import os
+import sys
+import threading
+import time
+
+from clients import THROTTLE_CODES, add_client_hook
+
+# Latency histogram bucket upper bounds in seconds (Prometheus' defaults)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PERCENTILES = (0.5, 0.9, 0.99)
+
+class OperationStats:
+    """Counters and a fixed-bucket latency histogram for one (service, operation, region).
+
+    Memory stays constant however many calls are made, so a scan issuing
+    millions of get_object_acl calls can be instrumented as cheaply as a
+    small one. Percentiles are interpolated within histogram buckets.
+    """
+
+    __slots__ = ('calls', 'errors', 'retries', 'throttles', 'bytes_received', 'latency_sum', 'buckets')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.throttles = 0
+        self.bytes_received = 0
+        self.latency_sum = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def observe(self, seconds):
+        self.calls += 1
+        self.latency_sum += seconds
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+
+    def percentile(self, q):
+        if not self.calls:
+            return 0.0
+        rank = q * self.calls
+        seen = 0
+        for i, count in enumerate(self.buckets):
+            if count and seen + count >= rank:
+                lower = LATENCY_BUCKETS[i - 1] if i else 0.0
+                upper = LATENCY_BUCKETS[i] if i < len(LATENCY_BUCKETS) else LATENCY_BUCKETS[-1]
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return LATENCY_BUCKETS[-1]
+
+    def to_dict(self):
+        result = {name: getattr(self, name) for name in self.__slots__ if name != 'buckets'}
+        result['latency_buckets'] = dict(zip([str(b) for b in LATENCY_BUCKETS] + ['+Inf'], self.buckets))
+        for q in PERCENTILES:
+            result[f"p{int(q * 100)}"] = self.percentile(q)
+        return result
+
+class Telemetry:
+    """Per-operation API call statistics collected from botocore's event system.
+
+    install() registers handlers on a client: before-call starts a timer in
+    the request context, needs-retry sees every attempt (so throttled
+    attempts that later succeed are still counted), and after-call /
+    after-call-error record latency, retries and response size. Service
+    errors come through after-call with an error status; after-call-error
+    only sees transport failures.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.stats = {}
+        self._lock = threading.Lock()
+
+    def _get(self, key):
+        stats = self.stats.get(key)
+        if stats is None:
+            with self._lock:
+                stats = self.stats.setdefault(key, OperationStats())
+        return stats
+
+    def install(self, client, session=None):
+        region = client.meta.region_name or 'global'
+        service = client.meta.service_model.service_name
+
+        def before_call(model, context, **kwargs):
+            context['telemetry_operation'] = model.name
+            context['telemetry_started'] = time.perf_counter()
+
+        def needs_retry(response, operation, **kwargs):
+            if response is None:
+                return None
+            code = response[1].get('Error', {}).get('Code')
+            if code in THROTTLE_CODES:
+                stats = self._get((service, operation.name, region))
+                with self._lock:
+                    stats.throttles += 1
+            return None
+
+        def after_call(model, http_response, parsed, context, **kwargs):
+            elapsed = time.perf_counter() - context.get('telemetry_started', time.perf_counter())
+            size = http_response.headers.get('content-length')
+            if size is None and not model.has_streaming_output:
+                size = len(http_response.content or b'')
+            stats = self._get((service, model.name, region))
+            with self._lock:
+                stats.observe(elapsed)
+                # Service errors (AccessDenied, a final throttle) also arrive
+                # here and are raised by the client afterwards
+                if http_response.status_code >= 300 or 'Error' in parsed:
+                    stats.errors += 1
+                stats.retries += parsed.get('ResponseMetadata', {}).get('RetryAttempts', 0)
+                stats.bytes_received += int(size or 0)
+
+        def after_call_error(context, exception, **kwargs):
+            elapsed = time.perf_counter() - context.get('telemetry_started', time.perf_counter())
+            operation = context.get('telemetry_operation', 'unknown')
+            stats = self._get((service, operation, region))
+            with self._lock:
+                stats.observe(elapsed)
+                stats.errors += 1
+
+        client.meta.events.register('before-call', before_call)
+        # First, so the retry handler's answer does not stop the event before we see the attempt
+        client.meta.events.register_first('needs-retry', needs_retry)
+        client.meta.events.register('after-call', after_call)
+        client.meta.events.register('after-call-error', after_call_error)
+
+    def snapshot(self):
+        with self._lock:
+            return sorted((key, stats.to_dict()) for key, stats in self.stats.items())
+
+    def summary_table(self):
+        rows = self.snapshot()
+        lines = [
+            f"{'Service':<16} {'Operation':<36} {'Region':<15} {'Calls':>8} {'Errors':>6} {'Retries':>7} "
+            f"{'Throttles':>9} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'KiB':>10}"
+        ]
+        for (service, operation, region), stats in sorted(rows, key=lambda r: -r[1]['latency_sum']):
+            lines.append(
+                f"{service:<16} {operation:<36} {region:<15} {stats['calls']:>8} {stats['errors']:>6} "
+                f"{stats['retries']:>7} {stats['throttles']:>9} {stats['p50'] * 1000:>8.1f} "
+                f"{stats['p90'] * 1000:>8.1f} {stats['p99'] * 1000:>8.1f} {stats['bytes_received'] / 1024:>10.1f}"
+            )
+        return '\n'.join(lines)
+
+    def to_json(self):
+        return {
+            'started': self.started,
+            'finished': time.time(),
+            'operations': [
+                dict(service=service, operation=operation, region=region, **stats)
+                for (service, operation, region), stats in self.snapshot()
+            ]
+        }
+
+    def to_prometheus(self):
+        """Render the statistics in the Prometheus text exposition format."""
+        lines = []
+        counters = [
+            ('calls', 'API calls completed'),
+            ('errors', 'API calls that failed'),
+            ('retries', 'Retry attempts reported by botocore'),
+            ('throttles', 'Throttled attempts'),
+            ('bytes_received', 'Response bytes received')
+        ]
+        rows = self.snapshot()
+        for name, help_text in counters:
+            lines.append(f"# HELP aws_scan_api_{name}_total {help_text}")
+            lines.append(f"# TYPE aws_scan_api_{name}_total counter")
+            for key, stats in rows:
+                lines.append(f"aws_scan_api_{name}_total{{{_labels(key)}}} {stats[name]}")
+        lines.append("# HELP aws_scan_api_latency_seconds API call latency")
+        lines.append("# TYPE aws_scan_api_latency_seconds histogram")
+        for key, stats in rows:
+            cumulative = 0
+            for bound, count in stats['latency_buckets'].items():
+                cumulative += count
+                lines.append(f"aws_scan_api_latency_seconds_bucket{{{_labels(key)},le=\"{bound}\"}} {cumulative}")
+            lines.append(f"aws_scan_api_latency_seconds_sum{{{_labels(key)}}} {stats['latency_sum']}")
+            lines.append(f"aws_scan_api_latency_seconds_count{{{_labels(key)}}} {stats['calls']}")
+        lines.append("# HELP aws_scan_last_run_timestamp_seconds When the scan finished")
+        lines.append("# TYPE aws_scan_last_run_timestamp_seconds gauge")
+        lines.append(f"aws_scan_last_run_timestamp_seconds {time.time()}")
+        return '\n'.join(lines) + '\n'
+
+def _labels(key):
+    service, operation, region = key
+    return f'service="{service}",operation="{operation}",region="{region}"'
+
+def _write_atomic(path, text):
+    # The node exporter textfile collector may read at any moment
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+_telemetry = None
+
+def enable():
+    """Start collecting statistics for every client created from now on."""
+    global _telemetry
+    if _telemetry is None:
+        _telemetry = Telemetry()
+        add_client_hook(_telemetry.install)
+    return _telemetry
+
+def report(summary=True, json_path=None, prometheus_path=None):
+    """Write the end-of-run outputs: a summary table on stderr, a JSON dump and a Prometheus textfile."""
+    if _telemetry is None:
+        return
+    if summary:
+        print("\n=== API CALL TELEMETRY ===", file=sys.stderr)
+        print(_telemetry.summary_table(), file=sys.stderr)
+    if json_path:
+        _write_atomic(json_path, json.dumps(_telemetry.to_json(), indent=1))
+    if prometheus_path:
+        _write_atomic(prometheus_path, _telemetry.to_prometheus())
@@ -0,0 +1,120 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts'))
+
+from policy_analysis import analyze_identity_policy, analyze_policy, normalize_statement
+
+ACCOUNT = '111111111111'
+OTHER = '222222222222'
+ORG = 'o-mine000000'
+
+def policy(**statement):
+    statement.setdefault('Effect', 'Allow')
+    return {'Statement': [statement]}
+
+class NormalizeStatementTest(unittest.TestCase):
+
+    def test_not_action_is_flagged(self):
+        statement = normalize_statement({'Effect': 'Allow', 'NotAction': 'iam:*', 'Resource': '*'})
+        self.assertTrue(statement.not_action)
+        self.assertEqual(statement.actions, ('iam:*',))
+        self.assertFalse(statement.not_resource)
+
+    def test_not_resource_is_flagged(self):
+        statement = normalize_statement({'Effect': 'Allow', 'Action': 's3:*', 'NotResource': 'arn:aws:s3:::b'})
+        self.assertTrue(statement.not_resource)
+        self.assertFalse(statement.not_action)
+
+class AnalyzePolicyTest(unittest.TestCase):
+
+    def test_not_principal_accounts_are_not_grantees(self):
+        document = policy(NotPrincipal={'AWS': f"arn:aws:iam::{OTHER}:root"}, Action='kms:*', Resource='*')
+        (analysis,) = analyze_policy(document, ACCOUNT, ORG)
+        self.assertEqual(analysis.external_accounts, ())
+        self.assertTrue(analysis.public)
+
+    def test_negated_org_condition_does_not_scope(self):
+        document = policy(Principal='*', Action='kms:Decrypt', Resource='*',
+                          Condition={'StringNotEquals': {'aws:PrincipalOrgID': ORG}})
+        (analysis,) = analyze_policy(document, ACCOUNT, ORG)
+        self.assertTrue(analysis.public)
+
+    def test_positive_org_condition_scopes(self):
+        document = policy(Principal='*', Action='kms:Decrypt', Resource='*',
+                          Condition={'StringEquals': {'aws:PrincipalOrgID': ORG}})
+        (analysis,) = analyze_policy(document, ACCOUNT, ORG)
+        self.assertFalse(analysis.public)
+        self.assertEqual(analysis.org_ids, (ORG,))
+        self.assertFalse(analysis.cross_org)
+
+    def test_source_ip_condition_does_not_scope(self):
+        document = policy(Principal='*', Action='lambda:InvokeFunction', Resource='*',
+                          Condition={'IpAddress': {'aws:SourceIp': '0.0.0.0/0'}})
+        (analysis,) = analyze_policy(document, ACCOUNT, ORG)
+        self.assertTrue(analysis.public)
+
+    def test_source_vpc_condition_does_not_scope(self):
+        document = policy(Principal='*', Action='s3:GetObject', Resource='*',
+                          Condition={'StringEquals': {'aws:SourceVpc': 'vpc-12345678'}})
+        (analysis,) = analyze_policy(document, ACCOUNT, ORG)
+        self.assertTrue(analysis.public)
+
+    def test_arn_condition_with_wildcard_account_does_not_scope(self):
+        document = policy(Principal='*', Action='kms:Decrypt', Resource='*',
+                          Condition={'ArnLike': {'aws:PrincipalArn': 'arn:aws:iam::*:role/x'}})
+        (analysis,) = analyze_policy(document, ACCOUNT, ORG)
+        self.assertTrue(analysis.public)
+
+    def test_arn_condition_with_concrete_account_scopes(self):
+        document = policy(Principal='*', Action='kms:Decrypt', Resource='*',
+                          Condition={'ArnLike': {'aws:PrincipalArn': f"arn:aws:iam::{OTHER}:role/*"}})
+        (analysis,) = analyze_policy(document, ACCOUNT, ORG)
+        self.assertFalse(analysis.public)
+        self.assertEqual(analysis.external_accounts, (OTHER,))
+
+    def test_if_exists_operator_does_not_scope(self):
+        document = policy(Principal='*', Action='kms:Decrypt', Resource='*',
+                          Condition={'StringEqualsIfExists': {'aws:PrincipalAccount': OTHER}})
+        (analysis,) = analyze_policy(document, ACCOUNT, ORG)
+        self.assertTrue(analysis.public)
+
+    def test_account_condition_scopes(self):
+        document = policy(Principal='*', Action='kms:Decrypt', Resource='*',
+                          Condition={'StringEquals': {'aws:SourceAccount': OTHER}})
+        (analysis,) = analyze_policy(document, ACCOUNT, ORG)
+        self.assertFalse(analysis.public)
+        self.assertEqual(analysis.external_accounts, (OTHER,))
+
+    def test_external_account_principal(self):
+        document = policy(Principal={'AWS': f"arn:aws:iam::{OTHER}:root"}, Action='kms:Decrypt', Resource='*')
+        (analysis,) = analyze_policy(document, ACCOUNT, ORG)
+        self.assertEqual(analysis.external_accounts, (OTHER,))
+
+class AnalyzeIdentityPolicyTest(unittest.TestCase):
+
+    def test_not_action_excluding_sts_does_not_assume_roles(self):
+        document = policy(NotAction='sts:*', Resource='*')
+        self.assertEqual(analyze_identity_policy(document, ACCOUNT), ())
+
+    def test_not_action_excluding_other_service_assumes_roles(self):
+        document = policy(NotAction='iam:*', Resource='*')
+        (access,) = analyze_identity_policy(document, ACCOUNT)
+        self.assertTrue(access.assume_role)
+        self.assertTrue(access.any_account)
+
+    def test_not_resource_covers_every_account(self):
+        document = policy(Action='sts:AssumeRole', NotResource=f"arn:aws:iam::{OTHER}:role/x")
+        (access,) = analyze_identity_policy(document, ACCOUNT)
+        self.assertTrue(access.any_account)
+        self.assertEqual(access.external_accounts, ())
+
+    def test_assume_role_in_external_account(self):
+        document = policy(Action='sts:AssumeRole', Resource=f"arn:aws:iam::{OTHER}:role/x")
+        (access,) = analyze_identity_policy(document, ACCOUNT)
+        self.assertEqual(access.external_accounts, (OTHER,))
+        self.assertFalse(access.any_account)
+
+if __name__ == '__main__':
+    unittest.main()